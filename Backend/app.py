@@ -1,180 +1,652 @@
+import time
+
+# Process start, for the startup timings reported by /api/model_status
+STARTED_AT = time.time()
+
 import os
+import json
+import struct
+import logging
+import math
+import threading
 import numpy as np
-import rasterio
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import tensorflow as tf
-from PIL import Image
-import json
-import cv2
-import traceback
-from pyproj import Proj, Transformer
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import InputLayer, Conv2D
+from raster_store import RasterStore, overview_level
+from cog import preferred_path
+from sr_product import product_path, is_fresh, read_tags, band_range, context_pixels, super_resolve_block
+from catalog import DEFAULT_POLLUTANT, RasterCatalog, normalize_pollutant, parse_date
+from features import get_aqi_color, values_to_aqi, sample_grid, build_features, features_json
+import geo
+import tiles
+import formats
+import points
+import zonal
+import forecast
+import metrics
+import compression
+import hashlib
+from srcnn import (build_srcnn_model, weights_hash, InferenceScheduler,
+                   make_predict_fn, max_abs_difference)
+from caches import ByteLRUCache
+
+# Leveled logging, quiet by default; AQI_LOG_LEVEL=INFO shows startup, DEBUG every request
+logging.basicConfig(
+    level=os.environ.get('AQI_LOG_LEVEL', 'WARNING').upper(),
+    format='%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s'
+)
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app)
-
-# Define the SRCNN model architecture manually instead of loading it
-print("Creating SRCNN model manually...")
-model = Sequential([
-    InputLayer(input_shape=(None, None, 1)),
-    Conv2D(64, (9, 9), activation='relu', padding='same'),
-    Conv2D(32, (1, 1), activation='relu', padding='same'),
-    Conv2D(1, (5, 5), activation='linear', padding='same')
-])
-model.compile(optimizer='adam', loss='mse', metrics=['mae'])
-
-# Try to load weights if the file exists
-model_path = os.path.join(os.path.dirname(__file__), 'model', 'srcnn_model.h5')
-if os.path.exists(model_path):
+CORS(app, expose_headers=['X-AQI-Metadata', 'Server-Timing', 'ETag'])
+
+# The SRCNN model is built in a background warm-up thread (see warm_up) so the
+# server answers liveness checks straight away. Until it's ready, requests are
+# served without super-resolution.
+model = None
+predict_fn = None
+MODEL_LOADED = False
+MODEL_READY = False
+WARM_UP_ERROR = None
+STARTUP_TIMINGS = {}
+
+model_path = os.environ.get('AQI_MODEL_PATH', os.path.join(os.path.dirname(__file__), 'model', 'srcnn_model.h5'))
+
+# How SRCNN is executed: keras (model.predict), tf_function or tflite. Anything
+# other than keras is checked against model.predict first and falls back on mismatch.
+INFERENCE_BACKEND = os.environ.get('AQI_INFERENCE_BACKEND', 'keras')
+
+# Identifies the weights in cache keys, so retrained weights never reuse stale results
+MODEL_WEIGHTS_HASH = weights_hash(model_path) if os.path.exists(model_path) else None
+
+
+def load_model():
+    """Build SRCNN, load its weights and set up the inference backend"""
+    global model, predict_fn, MODEL_LOADED, INFERENCE_BACKEND
+
+    # Several server processes share the cores (see gunicorn.conf.py)
+    tf_threads = int(os.environ.get('AQI_TF_THREADS', 0))
+    if tf_threads:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(tf_threads)
+        logger.info("TensorFlow limited to %d threads", tf_threads)
+
+    # Define the SRCNN model architecture manually instead of loading it
+    logger.info("Creating SRCNN model manually...")
+    new_model = build_srcnn_model()
+
+    # Try to load weights if the file exists
+    if os.path.exists(model_path):
+        try:
+            new_model.load_weights(model_path)
+            logger.info("Model weights loaded from %s", model_path)
+            loaded = True
+        except Exception as e:
+            logger.error("Could not load model weights: %s", e)
+            logger.error("The model will not provide accurate super-resolution.")
+            loaded = False
+    else:
+        logger.error("Model file not found at %s", model_path)
+        logger.error("Please ensure the model weights file exists.")
+        loaded = False
+
+    backend = INFERENCE_BACKEND
+    new_predict_fn = make_predict_fn(new_model, 'keras')
+    if loaded and backend != 'keras':
+        try:
+            candidate_fn = make_predict_fn(new_model, backend)
+            difference = max_abs_difference(candidate_fn, new_predict_fn)
+            if difference <= 1e-4:
+                new_predict_fn = candidate_fn
+                logger.info("Using %s inference backend (max difference from Keras %.1e)", backend, difference)
+            else:
+                logger.error("%s backend differs from Keras by %s, using keras", backend, difference)
+                backend = 'keras'
+        except Exception as e:
+            logger.error("Could not set up %s inference backend: %s", backend, e)
+            backend = 'keras'
+    elif not loaded:
+        backend = 'keras'
+
+    model, predict_fn, INFERENCE_BACKEND = new_model, new_predict_fn, backend
+    MODEL_LOADED = loaded
+
+
+def warm_up():
+    """Load the raster and the model in the background, then mark the server ready"""
+    global MODEL_READY, WARM_UP_ERROR
     try:
-        model.load_weights(model_path)
-        print(f"Model weights loaded from {model_path}")
-        MODEL_LOADED = True
+        started = time.time()
+        init_geotiff()
+        STARTUP_TIMINGS["raster_seconds"] = round(time.time() - started, 3)
+
+        started = time.time()
+        raster_catalog.scan()
+        STARTUP_TIMINGS["catalog_seconds"] = round(time.time() - started, 3)
+
+        if FORECAST_REFRESH_SECONDS > 0:
+            forecast.start_refresher(raster_catalog, FORECAST_REFRESH_SECONDS, FORECAST_DIR,
+                                     horizon=FORECAST_HORIZON)
+
+        started = time.time()
+        load_model()
+        STARTUP_TIMINGS["model_seconds"] = round(time.time() - started, 3)
     except Exception as e:
-        print(f"Error: Could not load model weights. Error: {e}")
-        print("The model will not provide accurate super-resolution.")
-        MODEL_LOADED = False
-else:
-    print(f"Error: Model file not found at {model_path}")
-    print("Please ensure the model weights file exists.")
-    MODEL_LOADED = False
+        WARM_UP_ERROR = str(e)
+        logger.exception("Error during warm-up: %s", e)
+    finally:
+        STARTUP_TIMINGS["ready_seconds"] = round(time.time() - STARTED_AT, 3)
+        MODEL_READY = True
+        logger.info("Warm-up finished %ss after start", STARTUP_TIMINGS['ready_seconds'])
+
 
-# GeoTIFF file path - update this to your actual file path
-GEOTIFF_PATH = os.path.join(os.path.dirname(__file__), 'data', 'Delhi_NO2_Jan2023.tif')
+# Super-resolution runs over the window in overlapping tiles so memory stays
+# bounded for large windows. The halo must cover the SRCNN receptive field.
+SR_TILE_SIZE = int(os.environ.get('AQI_SR_TILE_SIZE', 128))
+SR_TILE_HALO = int(os.environ.get('AQI_SR_TILE_HALO', 8))
+SR_MAX_BATCH = int(os.environ.get('AQI_SR_MAX_BATCH', 16))
+
+# Concurrent requests' tiles are collected for up to AQI_SR_BATCH_WAIT_MS and
+# run through the model together, at most SR_MAX_BATCH tiles per predict call.
+# Smaller tiles are padded to share a batch with larger ones up to
+# AQI_SR_MAX_PAD_RATIO times their pixels (1 to only batch equal shapes).
+inference_scheduler = InferenceScheduler(
+    lambda batch: predict_fn(batch),
+    max_batch=SR_MAX_BATCH,
+    max_wait_ms=float(os.environ.get('AQI_SR_BATCH_WAIT_MS', 5)),
+    max_pad_ratio=float(os.environ.get('AQI_SR_MAX_PAD_RATIO', 4))
+)
+
+# Super-resolved windows are cached after snapping them outward to this pixel
+# grid, so nearby views share entries. AQI_SR_CACHE_DIR persists them to disk.
+SR_CACHE_GRID = int(os.environ.get('AQI_SR_CACHE_GRID', 64))
+sr_cache = ByteLRUCache(
+    int(float(os.environ.get('AQI_SR_CACHE_MB', 256)) * 1024 * 1024),
+    persist_dir=os.environ.get('AQI_SR_CACHE_DIR')
+)
+
+# Super-resolution upsamples AQI_SR_SCALE times and normalizes by the whole
+# band's range. High-zoom windows are read from the product of
+# `python sr_product.py` at that scale (AQI_SR_PRODUCT=0 to ignore it) while it
+# matches the raster and model weights. Otherwise the same computation runs on
+# the window as above, so both give the same pixels.
+SR_SCALE = int(os.environ.get('AQI_SR_SCALE', 2))
+SR_PRODUCT = os.environ.get('AQI_SR_PRODUCT', '1') != '0'
+sr_product_stores = {}
+sr_product_lock = threading.Lock()
+# Tags of each product file, by (path, mtime), so freshness is known without loading it
+sr_product_tags = {}
+# (min, span) of each raster version's band, for normalization
+sr_band_ranges = {}
+
+# Large GeoJSON responses are streamed in chunks of about AQI_STREAM_CHUNK_POINTS
+# features instead of being built in memory. Clients can ask for streaming with
+# "stream": true; it is switched on automatically from AQI_STREAM_MIN_POINTS.
+STREAM_CHUNK_POINTS = int(os.environ.get('AQI_STREAM_CHUNK_POINTS', 5000))
+STREAM_MIN_POINTS = int(os.environ.get('AQI_STREAM_MIN_POINTS', 50000))
+
+# Summed-area tables (per raster version) and rasterized polygon masks (per
+# polygon id) for /api/region_stats. Rasters whose tables would take more than
+# half of AQI_REGION_CACHE_MB are summarized from the window instead.
+region_cache = ByteLRUCache(int(float(os.environ.get('AQI_REGION_CACHE_MB', 256)) * 1024 * 1024))
+region_tables_lock = threading.Lock()
+
+# get_air_quality responses carry a weak ETag of everything their body depends
+# on (see response_etag), so a matching If-None-Match is answered with 304
+# before the raster is read. Bodies are also kept, compressed, per ETag and
+# Content-Encoding in AQI_RESPONSE_CACHE_MB of memory.
+response_cache = ByteLRUCache(int(float(os.environ.get('AQI_RESPONSE_CACHE_MB', 128)) * 1024 * 1024))
+
+# get_air_quality with "interpolation" resamples the window onto a grid of
+# "grid_size" cells along its longer side (default AQI_INTERPOLATE_GRID_SIZE)
+INTERPOLATE_GRID_SIZE = int(os.environ.get('AQI_INTERPOLATE_GRID_SIZE', 256))
+INTERPOLATE_MAX_GRID_SIZE = int(os.environ.get('AQI_INTERPOLATE_MAX_GRID_SIZE', 1024))
+
+# Per-pixel forecasts fitted by forecast.py over the catalog's history. The
+# server refits changed histories every AQI_FORECAST_REFRESH_SECONDS (0 leaves
+# it to running `python forecast.py` from cron); requests read the resident bands.
+FORECAST_DIR = os.environ.get('AQI_FORECAST_DIR', forecast.DEFAULT_DIR)
+FORECAST_REFRESH_SECONDS = float(os.environ.get('AQI_FORECAST_REFRESH_SECONDS', 3600))
+FORECAST_HORIZON = int(os.environ.get('AQI_FORECAST_HORIZON', 3))
+forecast_stores = {}
+forecast_lock = threading.Lock()
+
+# Served while no forecast covers the request
+FALLBACK_FORECAST = [
+    {"day": "Today", "aqi": 120, "color": "#FF7E00"},
+    {"day": "Tomorrow", "aqi": 150, "color": "#FF7E00"},
+    {"day": "Day 3", "aqi": 180, "color": "#FF0000"}
+]
+
+# Largest number of points one /api/query_points request may ask for
+QUERY_MAX_POINTS = int(os.environ.get('AQI_QUERY_MAX_POINTS', 1000000))
+
+# GeoTIFF served when a request names no date or pollutant (AQI_GEOTIFF_PATH)
+GEOTIFF_PATH = os.environ.get('AQI_GEOTIFF_PATH', os.path.join(os.path.dirname(__file__), 'data', 'Delhi_NO2_Jan2023.tif'))
+
+# Prefer the Cloud-Optimized copy made by `python cog.py` unless the original is newer
+GEOTIFF_PATH = preferred_path(GEOTIFF_PATH)
 
 # Check if the GeoTIFF file exists
 if not os.path.exists(GEOTIFF_PATH):
-    print(f"Error: GeoTIFF file not found at {GEOTIFF_PATH}")
-    print("Please ensure the GeoTIFF file exists in the data directory.")
+    logger.error("GeoTIFF file not found at %s", GEOTIFF_PATH)
+    logger.error("Please ensure the GeoTIFF file exists in the data directory.")
     GEOTIFF_EXISTS = False
 else:
     GEOTIFF_EXISTS = True
 
+# The band is decoded once and shared between requests. Set AQI_RASTER_MMAP_DIR
+# to memory-map it from a .npy sidecar instead of holding a private copy.
+raster_store = RasterStore(GEOTIFF_PATH, mmap_dir=os.environ.get('AQI_RASTER_MMAP_DIR'))
+
+# Rendered XYZ tiles, keyed by raster version. Pre-seed with `python tiles.py seed`.
+tile_cache = tiles.TileCache(os.environ.get('AQI_TILE_CACHE_DIR', tiles.DEFAULT_CACHE_DIR),
+                             int(float(os.environ.get('AQI_TILE_CACHE_MB', 1024)) * 1024 * 1024))
+
+# Rasters by pollutant and date, for requests that ask for one. The index lives
+# in SQLite and the directory is rescanned every AQI_CATALOG_RESCAN_SECONDS, so
+# newly ingested files are picked up without a restart. Requests without a
+# date or pollutant keep using GEOTIFF_PATH.
+raster_catalog = RasterCatalog(
+    os.environ.get('AQI_CATALOG_DIR', os.path.join(os.path.dirname(__file__), 'data')),
+    os.environ.get('AQI_CATALOG_DB', os.path.join(os.path.dirname(__file__), 'cache', 'catalog.sqlite')),
+    pool_size=int(os.environ.get('AQI_CATALOG_POOL_SIZE', 4)),
+    rescan_seconds=float(os.environ.get('AQI_CATALOG_RESCAN_SECONDS', 60)),
+    mmap_dir=os.environ.get('AQI_RASTER_MMAP_DIR')
+)
+
 # Cache the transformation parameters
 transform = None
+inverse_transform = None
 bounds = None
 # Set default bounds for Delhi
 DEFAULT_BOUNDS = (77.0, 28.4, 77.4, 28.8)  # (left, bottom, right, top) or (west, south, east, north)
 
 # Initialize the geotiff data
 def init_geotiff():
-    global transform, bounds, GEOTIFF_EXISTS
+    global transform, inverse_transform, bounds, GEOTIFF_EXISTS
     try:
         if os.path.exists(GEOTIFF_PATH):
-            with rasterio.open(GEOTIFF_PATH) as src:
-                transform = src.transform
-                bounds = src.bounds
-                print(f"GeoTIFF loaded: {GEOTIFF_PATH}")
-                print(f"Bounds: {bounds}")
-                GEOTIFF_EXISTS = True
+            snapshot = raster_store.get()
+            transform = snapshot.transform
+            inverse_transform = snapshot.inverse_transform
+            bounds = snapshot.bounds
+            logger.info("GeoTIFF loaded: %s", GEOTIFF_PATH)
+            logger.info("Bounds: %s", bounds)
+            GEOTIFF_EXISTS = True
         else:
             raise FileNotFoundError(f"GeoTIFF file not found: {GEOTIFF_PATH}")
     except Exception as e:
-        print(f"Error loading GeoTIFF: {e}")
+        logger.error("Error loading GeoTIFF: %s", e)
        
         bounds = DEFAULT_BOUNDS
-        print(f"Using default bounds for Delhi: {bounds}")
+        logger.warning("Using default bounds for Delhi: %s", bounds)
         GEOTIFF_EXISTS = False
 
 
 def pixel_to_geo(row, col):
+    lons, lats = pixel_to_geo_array([row], [col])
+    return float(lons[0]), float(lats[0])
+
+
+def pixel_to_geo_array(rows, cols, snapshot=None):
+    """Vectorized pixel_to_geo: (lons, lats) arrays for arrays of rows and cols.
+
+    Uses the georeferencing of snapshot when given, else of GEOTIFF_PATH.
+    """
+    ref_transform = snapshot.transform if snapshot is not None else transform
     try:
-        if transform is not None:
-            return rasterio.transform.xy(transform, row, col)
-        else:
-         
-            lon = bounds[0] + (bounds[2] - bounds[0]) * (col / 1000)
-            lat = bounds[1] + (bounds[3] - bounds[1]) * (row / 1000)
-            return lon, lat
+        if ref_transform is not None:
+            return geo.pixel_to_xy(rows, cols, ref_transform)
+        return _bounds_pixel_to_geo(rows, cols, bounds)
     except Exception as e:
-        print(f"Error in pixel_to_geo: {e}")
-        
-        lon = DEFAULT_BOUNDS[0] + (DEFAULT_BOUNDS[2] - DEFAULT_BOUNDS[0]) * (col / 1000)
-        lat = DEFAULT_BOUNDS[1] + (DEFAULT_BOUNDS[3] - DEFAULT_BOUNDS[1]) * (row / 1000)
-        return lon, lat
+        logger.error("Error in pixel_to_geo: %s", e)
+        return _bounds_pixel_to_geo(rows, cols, DEFAULT_BOUNDS)
+
+
+def _bounds_pixel_to_geo(rows, cols, ref_bounds):
+    rows = np.asarray(rows, dtype=np.float64)
+    cols = np.asarray(cols, dtype=np.float64)
+    lons = ref_bounds[0] + (ref_bounds[2] - ref_bounds[0]) * (cols / 1000)
+    lats = ref_bounds[1] + (ref_bounds[3] - ref_bounds[1]) * (rows / 1000)
+    return lons, lats
 
-# Initialize the transformer for WGS 84 to UTM zone 43N
-transformer = Transformer.from_crs("EPSG:4326", "EPSG:32643", always_xy=True)
 
 def geo_to_pixel(lon, lat):
-    try:
-        if transform is not None:
-            # Transform geographic coordinates (lon, lat) to UTM (x, y)
-            x, y = transformer.transform(lon, lat)
-            print(f"Transformed geo ({lon}, {lat}) to UTM ({x}, {y})")
+    rows, cols = geo_to_pixel_array([lon], [lat])
+    return int(rows[0]), int(cols[0])
 
-            # Convert UTM coordinates to pixel coordinates
-            row, col = rasterio.transform.rowcol(transform, x, y)
-            print(f"Converted UTM ({x}, {y}) to pixel ({row}, {col})")
 
-            # Validate pixel coordinates
-            if row < 0 or col < 0 or row >= 10000 or col >= 10000:
-                print(f"Suspicious pixel coordinates: ({row}, {col}), using fallback")
-                raise ValueError("Pixel coordinates out of reasonable bounds")
+def geo_to_pixel_array(lons, lats, snapshot=None):
+    """Vectorized geo_to_pixel: (rows, cols) int arrays for arrays of lons and lats.
 
-            return row, col
-        else:
-            print(f"No transform available, using bounds-based calculation for ({lon}, {lat})")
-            if bounds is not None:
-                norm_x = (lon - bounds[0]) / (bounds[2] - bounds[0])
-                norm_y = (lat - bounds[1]) / (bounds[3] - bounds[1])
+    Uses the georeferencing of snapshot when given, else of GEOTIFF_PATH.
+    """
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    ref_inverse = snapshot.inverse_transform if snapshot is not None else inverse_transform
+    try:
+        if ref_inverse is not None:
+            # WGS 84 -> UTM in one pyproj call, then the cached inverse affine
+            rows, cols = geo.lonlat_to_pixel(lons, lats, ref_inverse)
 
-                img_height = 1000
-                img_width = 1000
+            # Validate pixel coordinates
+            suspicious = (rows < 0) | (cols < 0) | (rows >= 10000) | (cols >= 10000)
+            if suspicious.any():
+                # Bboxes running past the raster edge do this all the time while panning
+                logger.debug("Suspicious pixel coordinates for %d point(s), using fallback", int(suspicious.sum()))
+                rows[suspicious], cols[suspicious] = fallback_geo_to_pixel_array(
+                    lons[suspicious], lats[suspicious])
+            return rows, cols
+        elif bounds is not None:
+            norm_x = (lons - bounds[0]) / (bounds[2] - bounds[0])
+            norm_y = (lats - bounds[1]) / (bounds[3] - bounds[1])
 
-                row = int(img_height * (1 - norm_y))
-                col = int(img_width * norm_x)
+            img_height = 1000
+            img_width = 1000
 
-                print(f"Bounds-based conversion: ({lon}, {lat}) -> ({row}, {col})")
-                return row, col
-            else:
-                return fallback_geo_to_pixel(lon, lat)
+            rows = (img_height * (1 - norm_y)).astype(np.int64)
+            cols = (img_width * norm_x).astype(np.int64)
+            return rows, cols
+        else:
+            return fallback_geo_to_pixel_array(lons, lats)
     except Exception as e:
-        print(f"Error in geo_to_pixel for ({lon}, {lat}): {e}")
-        print(f"Using emergency fallback conversion")
-        return fallback_geo_to_pixel(lon, lat)
+        logger.error("Error in geo_to_pixel: %s, using emergency fallback conversion", e)
+        return fallback_geo_to_pixel_array(lons, lats)
 
 
 def fallback_geo_to_pixel(lon, lat):
+    rows, cols = fallback_geo_to_pixel_array([lon], [lat])
+    return int(rows[0]), int(cols[0])
+
+
+def fallback_geo_to_pixel_array(lons, lats):
     min_lon, min_lat, max_lon, max_lat = bounds if bounds else DEFAULT_BOUNDS
 
     # Clamp coordinates to the bounds
-    bounded_lon = max(min_lon, min(lon, max_lon))
-    bounded_lat = max(min_lat, min(lat, max_lat))
+    bounded_lon = np.clip(np.asarray(lons, dtype=np.float64), min_lon, max_lon)
+    bounded_lat = np.clip(np.asarray(lats, dtype=np.float64), min_lat, max_lat)
 
     # Normalize coordinates
     norm_x = (bounded_lon - min_lon) / (max_lon - min_lon)
     norm_y = (bounded_lat - min_lat) / (max_lat - min_lat)
 
     # Convert to pixel coordinates
-    col = int(500 * norm_x)
-    row = int(500 * (1 - norm_y))
-
-    print(f"Fallback conversion: ({lon}, {lat}) -> ({row}, {col})")
-    return row, col
-
-
-def get_aqi_color(aqi_value):
-    if aqi_value <= 50:
-        return "#00E400"  # Green - Good
-    elif aqi_value <= 100:
-        return "#FFFF00"  # Yellow - Moderate
-    elif aqi_value <= 150:
-        return "#FF7E00"  # Orange - Unhealthy for sensitive groups
-    elif aqi_value <= 200:
-        return "#FF0000"  # Red - Unhealthy
-    elif aqi_value <= 300:
-        return "#99004C"  # Purple - Very unhealthy
+    cols = (500 * norm_x).astype(np.int64)
+    rows = (500 * (1 - norm_y)).astype(np.int64)
+    return rows, cols
+
+
+def snap_to_grid(start, stop, limit, grid):
+    """Widen [start, stop) outward to multiples of grid, clipped to [0, limit)"""
+    return (start // grid) * grid, min(-(-stop // grid) * grid, limit)
+
+
+def get_band_range(snapshot):
+    """(min, span) a snapshot's band is normalized by for SRCNN, as in sr_product.build"""
+    data_range = sr_band_ranges.get(snapshot.version)
+    if data_range is None:
+        with metrics.stage('normalize'):
+            data_range = band_range(snapshot.data, snapshot.nodata)
+        if len(sr_band_ranges) >= 64:
+            sr_band_ranges.clear()
+        sr_band_ranges[snapshot.version] = data_range
+    return data_range
+
+
+def super_resolve(snapshot, row_min, row_max, col_min, col_max):
+    """Run SRCNN over a raster window at SR_SCALE times the pixels, as sr_product does for the whole band"""
+    height, width = snapshot.data.shape
+    # Enough context around the window that its pixels match the product's
+    pad = context_pixels(SR_SCALE)
+    read_row_min, read_row_max = max(0, row_min - pad), min(height, row_max + pad)
+    read_col_min, read_col_max = max(0, col_min - pad), min(width, col_max + pad)
+    block = raster_store.window(read_row_min, read_row_max, read_col_min, read_col_max, snapshot)
+
+    logger.debug("Running SRCNN model for super-resolution...")
+    with metrics.stage('predict'):
+        data_sr = super_resolve_block(inference_scheduler.predict, block, snapshot.nodata, *get_band_range(snapshot),
+                                      SR_SCALE, SR_TILE_SIZE, SR_TILE_HALO, SR_MAX_BATCH)
+    logger.debug("Super-resolution complete: input shape %s, output shape %s", block.shape, data_sr.shape)
+
+    row_offset, col_offset = (row_min - read_row_min) * SR_SCALE, (col_min - read_col_min) * SR_SCALE
+    return data_sr[row_offset:row_offset + (row_max - row_min) * SR_SCALE,
+                   col_offset:col_offset + (col_max - col_min) * SR_SCALE]
+
+
+def super_resolve_window(snapshot, row_min, row_max, col_min, col_max):
+    """Super-resolved pixels for a raster window (SR_SCALE per source pixel), served from sr_cache when possible"""
+    height, width = snapshot.data.shape
+    sr_row_min, sr_row_max = snap_to_grid(row_min, row_max, height, SR_CACHE_GRID)
+    sr_col_min, sr_col_max = snap_to_grid(col_min, col_max, width, SR_CACHE_GRID)
+
+    key = (snapshot.version, MODEL_WEIGHTS_HASH, SR_SCALE, sr_row_min, sr_row_max, sr_col_min, sr_col_max)
+    data_sr = sr_cache.get(key)
+    if data_sr is None:
+        data_sr = super_resolve(snapshot, sr_row_min, sr_row_max, sr_col_min, sr_col_max)
+        sr_cache.put(key, data_sr)
     else:
-        return "#7E0023"  # Maroon - Hazardous
+        logger.debug("Super-resolution served from cache for rows(%d,%d), cols(%d,%d)", sr_row_min, sr_row_max, sr_col_min, sr_col_max)
+
+    return data_sr[(row_min - sr_row_min) * SR_SCALE:(row_max - sr_row_min) * SR_SCALE,
+                   (col_min - sr_col_min) * SR_SCALE:(col_max - sr_col_min) * SR_SCALE]
+
+
+def fresh_sr_product(source_path, snapshot):
+    """(path, mtime) of the offline super-resolved product of a raster, or None if it's missing or stale.
+
+    Only the product's tags are read, so this is cheap enough to run before the ETag check.
+    """
+    if not SR_PRODUCT:
+        return None
+    path = product_path(source_path, SR_SCALE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    tags = sr_product_tags.get((path, mtime))
+    if tags is None:
+        tags = read_tags(path)
+        if len(sr_product_tags) >= 64:
+            sr_product_tags.clear()
+        sr_product_tags[(path, mtime)] = tags
+    if not is_fresh(tags, snapshot, MODEL_WEIGHTS_HASH):
+        logger.warning("Super-resolved product %s is stale, falling back to online super-resolution", path)
+        return None
+    return path, mtime
+
+
+def get_sr_product(path):
+    """Snapshot of a super-resolved product found by fresh_sr_product"""
+    with sr_product_lock:
+        store = sr_product_stores.get(path)
+        if store is None:
+            store = sr_product_stores[path] = RasterStore(path, mmap_dir=os.environ.get('AQI_RASTER_MMAP_DIR'))
+    return store.get()
+
+
+def read_overview_window(snapshot, row_min, row_max, col_min, col_max, sample_rate):
+    """Read a window from the coarsest overview that still has sample_rate resolution.
+
+    Returns (data, sample rate within that level, to_pixel) where to_pixel maps
+    offsets into data to full-resolution pixel coordinates. Plain GeoTIFFs have
+    no overviews, so this is then the full-resolution window.
+    """
+    factor, level = overview_level(snapshot, sample_rate)
+    if factor == 1:
+        return (raster_store.window(row_min, row_max, col_min, col_max, snapshot), sample_rate,
+                lambda rows, cols: (row_min + rows, col_min + cols))
+
+    height, width = snapshot.data.shape
+    row_scale = height / level.shape[0]
+    col_scale = width / level.shape[1]
+    level_row_min = int(row_min // row_scale)
+    level_col_min = int(col_min // col_scale)
+    level_row_max = max(level_row_min + 1, math.ceil(row_max / row_scale))
+    level_col_max = max(level_col_min + 1, math.ceil(col_max / col_scale))
+    logger.debug("Reading overview 1/%d: rows(%d,%d), cols(%d,%d)", factor, level_row_min, level_row_max, level_col_min, level_col_max)
+
+    def to_pixel(rows, cols):
+        # Overview pixel centres, in full-resolution pixel coordinates
+        return ((level_row_min + np.asarray(rows) + 0.5) * row_scale - 0.5,
+                (level_col_min + np.asarray(cols) + 0.5) * col_scale - 0.5)
+
+    data = level[level_row_min:level_row_max, level_col_min:level_col_max]
+    return data, max(1, round(sample_rate / factor)), to_pixel
+
+
+def interpolate_window(raster_data, to_pixel, grid_size, interpolation):
+    """Resample raster_data onto grid_size cells along its longer side.
+
+    Returns (grid, to_pixel) with to_pixel mapping grid cells to full-resolution
+    pixel coordinates of their centres.
+    """
+    height, width = raster_data.shape
+    scale = grid_size / max(height, width)
+    shape = (max(1, round(height * scale)), max(1, round(width * scale)))
+    grid = points.resample_grid(raster_data, shape, interpolation)
+    row_step = height / shape[0]
+    col_step = width / shape[1]
+    return grid, lambda rows, cols: to_pixel((np.asarray(rows) + 0.5) * row_step - 0.5,
+                                             (np.asarray(cols) + 0.5) * col_step - 0.5)
+
+
+def stream_feature_collection(snapshot, raster_data, sample_rate, to_pixel, metadata):
+    """Yield a GeoJSON FeatureCollection a block of sampled rows at a time"""
+    sampled_width = -(-raster_data.shape[1] // sample_rate)
+    block_rows = max(1, STREAM_CHUNK_POINTS // sampled_width) * sample_rate
+    yield '{"type": "FeatureCollection", "features": ['
+    first = True
+    for block_start in range(0, raster_data.shape[0], block_rows):
+        with metrics.stage('features'):
+            values, rows, cols = sample_grid(raster_data[block_start:block_start + block_rows], sample_rate)
+            if values.size == 0:
+                continue
+            lons, lats = pixel_to_geo_array(*to_pixel(block_start + rows, cols), snapshot)
+            aqi = values_to_aqi(values)
+        with metrics.stage('serialize'):
+            chunk = features_json(lons, lats, aqi, {"is_model_data": True})
+        yield chunk if first else ',' + chunk
+        first = False
+    yield '], "metadata": ' + json.dumps(metadata) + '}'
+
+
+def find_catalog_entry(params, lonlat_bounds):
+    """Catalog raster for a request's optional "date" and "pollutant" fields.
+
+    Returns None when neither is given. Raises ValueError for malformed fields
+    and LookupError when no raster matches.
+    """
+    if params.get('date') is None and params.get('pollutant') is None:
+        return None
+    try:
+        date = parse_date(params['date']) if params.get('date') is not None else None
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date {params.get('date')!r}, expected YYYY-MM-DD")
+    if not isinstance(params.get('pollutant') or '', str):
+        raise ValueError("Invalid pollutant parameter")
+    entry = raster_catalog.lookup(params.get('pollutant'), date, lonlat_bounds)
+    if entry is None:
+        raise LookupError("No raster for the requested date and pollutant")
+    logger.debug("Using catalog raster %s", entry.path)
+    return entry
+
+
+def get_snapshot(catalog_entry=None):
+    """Current snapshot of a catalog raster, or of GEOTIFF_PATH"""
+    if catalog_entry is not None:
+        return raster_catalog.store(catalog_entry).get()
+    snapshot = raster_store.get()
+    if snapshot.transform != transform:
+        # First request, or the file was replaced on disk
+        init_geotiff()
+    return snapshot
+
+
+def raster_metadata(catalog_entry):
+    return {"pollutant": catalog_entry.pollutant, "timestamp": catalog_entry.timestamp.isoformat()}
+
+
+REGION_TABLE_KEYS = ('sat-sums', 'sat-counts', 'sat-mins', 'sat-maxs')
+
+
+def get_summed_area_tables(snapshot):
+    """Cached zonal region tables for a snapshot, or None if they're too big to keep"""
+    if zonal.table_bytes(snapshot.data.shape) > region_cache.max_bytes // 2:
+        return None
+    tables = [region_cache.get((name, snapshot.version)) for name in REGION_TABLE_KEYS]
+    if all(table is not None for table in tables):
+        return tables
+    with region_tables_lock:
+        # Another request may have built them while we waited
+        tables = [region_cache.get((name, snapshot.version)) for name in REGION_TABLE_KEYS]
+        if any(table is None for table in tables):
+            started = time.time()
+            tables = zonal.region_tables(snapshot.data)
+            for name, table in zip(REGION_TABLE_KEYS, tables):
+                region_cache.put((name, snapshot.version), table)
+            logger.info("Built region tables for raster %s in %.2fs", snapshot.version, time.time() - started)
+    return tables
+
+
+def response_etag(snapshot, catalog_entry, sr_product_file, window, zoom_level, response_format,
+                  use_super_resolution, interpolation, grid_size):
+    """Weak ETag of a get_air_quality response, the same for every request that gets the same body"""
+    key = json.dumps([
+        snapshot.version,
+        raster_metadata(catalog_entry) if catalog_entry is not None else None,
+        sr_product_file,
+        MODEL_WEIGHTS_HASH if MODEL_LOADED else None,
+        window, zoom_level, response_format, use_super_resolution,
+        interpolation, grid_size if interpolation else None
+    ])
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def cached_response(etag, encoding):
+    """A get_air_quality response from response_cache, or None"""
+    entry = response_cache.get((etag, encoding))
+    if entry is None:
+        return None
+    # One entry per response: uint32 length of the headers JSON, the JSON, then the body
+    size, = struct.unpack_from('<I', entry)
+    response = etag_response(entry[4 + size:], json.loads(entry[4:4 + size]), etag)
+    response.headers['X-AQI-Cache'] = 'hit'
+    return response
+
+
+def etag_response(body, headers, etag):
+    """Response for a cached (possibly compressed) body"""
+    response = Response(body, mimetype=headers['mimetype'])
+    return tag_response(response, headers, etag)
+
+
+def tag_response(response, headers, etag):
+    """Set the Content-Encoding, metadata and validator headers of a get_air_quality response"""
+    if headers['encoding'] != 'identity':
+        response.headers['Content-Encoding'] = headers['encoding']
+    if headers.get('metadata') is not None:
+        response.headers['X-AQI-Metadata'] = headers['metadata']
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Clients may keep the body but must revalidate it with If-None-Match
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def binary_response(body, response_format, metadata):
+    """Binary AQI payload, with the metadata GeoJSON responses carry in an X-AQI-Metadata header"""
+    response = Response(body, mimetype=formats.FORMATS[response_format])
+    response.headers['X-AQI-Metadata'] = json.dumps(metadata)
+    return response
+
 
 @app.route('/api/get_air_quality', methods=['POST'])
 def get_air_quality():
     try:
         data = request.json
-        print(f"Received request with data: {data}")
+        logger.debug("Received request with data: %s", data)
         
         # Extract bounds from request
         lat_min = data.get('lat_min', 28.4)
@@ -185,166 +657,415 @@ def get_air_quality():
         
         # Validate bounds
         if not all(isinstance(x, (int, float)) for x in [lat_min, lat_max, lon_min, lon_max, zoom_level]):
-            print(f"Invalid bounds: lat_min={lat_min}, lat_max={lat_max}, lon_min={lon_min}, lon_max={lon_max}")
+            logger.debug("Invalid bounds: lat_min=%s, lat_max=%s, lon_min=%s, lon_max=%s", lat_min, lat_max, lon_min, lon_max)
             return jsonify({"error": "Invalid bounds parameters"}), 400
         
+        # Response format: explicit "format" field, else the Accept header, else GeoJSON
+        response_format = formats.negotiate_format(data.get('format'), request.accept_mimetypes)
+        if response_format is None:
+            return jsonify({
+                "error": f"Unsupported format {data.get('format')!r}",
+                "available_formats": formats.available_formats()
+            }), 406
+        
+        # Optional server-side resampling onto a regular grid (see interpolate_window)
+        interpolation = data.get('interpolation')
+        grid_size = data.get('grid_size', INTERPOLATE_GRID_SIZE)
+        if interpolation is not None and interpolation not in points.INTERPOLATIONS:
+            return jsonify({"error": f"Unknown interpolation {interpolation!r}, expected one of {points.INTERPOLATIONS}"}), 400
+        if not isinstance(grid_size, int) or not 1 <= grid_size <= INTERPOLATE_MAX_GRID_SIZE:
+            return jsonify({"error": f"grid_size must be an integer from 1 to {INTERPOLATE_MAX_GRID_SIZE}"}), 400
+        
         # For too large areas, provide less detailed data but still use real data when possible
         use_super_resolution = not (abs(lat_max - lat_min) > 2 or abs(lon_max - lon_min) > 2)
     
-        if not GEOTIFF_EXISTS:
-            print("Warning: GeoTIFF file not found, using mock data")
+        # Optional "date" (ISO) and "pollutant" pick a raster from the catalog
+        try:
+            catalog_entry = find_catalog_entry(data, (lon_min, lat_min, lon_max, lat_max))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        if catalog_entry is None and not GEOTIFF_EXISTS:
+            logger.warning("GeoTIFF file not found, using mock data")
             return generate_aqi_data(lat_min, lat_max, lon_min, lon_max, zoom_level)
             
         try:
-            with rasterio.open(GEOTIFF_PATH) as src:
+            with metrics.stage('open'):
+                snapshot = get_snapshot(catalog_entry)
+            height, width = snapshot.data.shape
+        except Exception as e:
+            logger.exception("Error opening GeoTIFF: %s", e)
+            return jsonify({"error": f"Error opening GeoTIFF file: {str(e)}"}), 500
+
+        try:
+            # Convert geographic bounds (upper left, lower right) to pixel coordinates
+            with metrics.stage('transform'):
+                rows, cols = geo_to_pixel_array([lon_min, lon_max], [lat_max, lat_min], snapshot)
+            row_min, row_max = int(rows[0]), int(rows[1])
+            col_min, col_max = int(cols[0]), int(cols[1])
+            
+            logger.debug("Initial window: rows(%d,%d), cols(%d,%d)", row_min, row_max, col_min, col_max)
+            
+            # Ensure coordinates are within bounds and properly ordered
+            row_min = max(0, min(row_min, height - 1))
+            row_max = max(0, min(row_max, height - 1))
+            col_min = max(0, min(col_min, width - 1))
+            col_max = max(0, min(col_max, width - 1))
+            
+            # Swap if needed to ensure row_min < row_max and col_min < col_max
+            if row_min > row_max:
+                row_min, row_max = row_max, row_min
+            if col_min > col_max:
+                col_min, col_max = col_max, col_min
+            
+            # Ensure we have a valid window size (at least 1x1)
+            if row_min == row_max:
+                row_max = min(row_min + 1, height - 1)
+            if col_min == col_max:
+                col_max = min(col_min + 1, width - 1)
+            
+            logger.debug("Adjusted window: rows(%d,%d), cols(%d,%d)", row_min, row_max, col_min, col_max)
+            
+            # Make sure we have a valid window
+            if row_min >= row_max or col_min >= col_max:
+                logger.debug("Invalid window after adjustment: rows(%d,%d), cols(%d,%d)", row_min, row_max, col_min, col_max)
+                return generate_aqi_data(lat_min, lat_max, lon_min, lon_max, zoom_level)
+            
+            # At high zoom, windows come from the precomputed super-resolved product when there is one
+            sr_product_file = None
+            if zoom_level >= 12 and use_super_resolution:
+                sr_product_file = fresh_sr_product(catalog_entry.path if catalog_entry else GEOTIFF_PATH, snapshot)
+            
+            # Everything the body depends on is known now, so repeats are answered without reading the raster
+            etag = response_etag(snapshot, catalog_entry, sr_product_file, (row_min, row_max, col_min, col_max),
+                                 zoom_level, response_format, use_super_resolution, interpolation, grid_size)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag, weak=True)
+                return response
+            encoding = compression.negotiate_encoding(request.accept_encodings)
+            response = cached_response(etag, encoding)
+            if response is not None:
+                return response
+            # Compressed, cached and tagged by compress_air_quality_response
+            g.response_cache_key = (etag, encoding)
+            
+            sr_product = None
+            if sr_product_file is not None:
+                with metrics.stage('window'):
+                    sr_product = get_sr_product(sr_product_file[0])
+            
+            # Read data within bounds
+            with metrics.stage('window'):
+                raster_data = raster_store.window(row_min, row_max, col_min, col_max, snapshot)
+                empty = raster_data.size == 0 or np.all(np.isnan(raster_data))
+            
+            # Check if we got any valid data
+            if empty:
+                logger.debug("Empty or NaN data from raster")
+                return jsonify({"error": "No valid data in selected region"}), 400
+            
+            # Sample points for the response
+            # The higher the zoom level, the more points we include
+            sample_rate = max(1, int(raster_data.shape[0] * raster_data.shape[1] / (500 * zoom_level / 10)))
+            
+            # Offsets into raster_data -> full-resolution pixel coordinates
+            to_pixel = lambda rows, cols: (row_min + np.asarray(rows), col_min + np.asarray(cols))
+            
+            # If zoom level is high, read the precomputed super-resolved product
+            # or else apply super-resolution if the model is loaded
+            super_resolved = False
+            if sr_product is not None:
+                logger.debug("Reading super-resolved product at zoom level %s", zoom_level)
+                raster_data = sr_product.data[row_min * SR_SCALE:row_max * SR_SCALE,
+                                              col_min * SR_SCALE:col_max * SR_SCALE]
+                super_resolved = True
+            elif zoom_level >= 12 and use_super_resolution and MODEL_LOADED:
+                logger.debug("Applying super-resolution at zoom level %s", zoom_level)
                 try:
-                    # Convert geographic bounds to pixel coordinates
-                    row_min, col_min = geo_to_pixel(lon_min, lat_max)  # Upper left
-                    row_max, col_max = geo_to_pixel(lon_max, lat_min)  # Lower right
-                    
-                    print(f"Initial window: rows({row_min},{row_max}), cols({col_min},{col_max})")
-                    
-                    # Ensure coordinates are within bounds and properly ordered
-                    row_min = max(0, min(row_min, src.height - 1))
-                    row_max = max(0, min(row_max, src.height - 1))
-                    col_min = max(0, min(col_min, src.width - 1))
-                    col_max = max(0, min(col_max, src.width - 1))
-                    
-                    # Swap if needed to ensure row_min < row_max and col_min < col_max
-                    if row_min > row_max:
-                        row_min, row_max = row_max, row_min
-                    if col_min > col_max:
-                        col_min, col_max = col_max, col_min
-                    
-                    # Ensure we have a valid window size (at least 1x1)
-                    if row_min == row_max:
-                        row_max = min(row_min + 1, src.height - 1)
-                    if col_min == col_max:
-                        col_max = min(col_min + 1, src.width - 1)
-                    
-                    print(f"Adjusted window: rows({row_min},{row_max}), cols({col_min},{col_max})")
-                    
-                    # Make sure we have a valid window
-                    if row_min >= row_max or col_min >= col_max:
-                        print(f"Invalid window after adjustment: rows({row_min},{row_max}), cols({col_min},{col_max})")
-                        return generate_aqi_data(lat_min, lat_max, lon_min, lon_max, zoom_level)
-                    
-                    # Read data within bounds
-                    window = ((row_min, row_max), (col_min, col_max))
-                    raster_data = src.read(1, window=window)
-                    
-                    # Check if we got any valid data
-                    if raster_data.size == 0 or np.all(np.isnan(raster_data)):
-                        print("Empty or NaN data from raster")
-                        return jsonify({"error": "No valid data in selected region"}), 400
-                    
-                    # If zoom level is high and model is loaded, apply super-resolution
-                    if zoom_level >= 12 and use_super_resolution and MODEL_LOADED:
-                        print(f"Applying super-resolution at zoom level {zoom_level}")
-                        try:
-                            # Normalize safely with handling for edge cases
-                            data_min = np.nanmin(raster_data) if raster_data.size > 0 else 0
-                            data_max = np.nanmax(raster_data) if raster_data.size > 0 else 255
-                            
-                            # Handle case where min == max (constant values)
-                            if data_max == data_min:
-                                data_norm = np.zeros_like(raster_data, dtype=np.float32)
-                            else:
-                                data_norm = (raster_data - data_min) / (data_max - data_min)
-                            
-                            # Replace NaNs with zeros
-                            data_norm = np.nan_to_num(data_norm)
-                            
-                            data_input = np.expand_dims(np.expand_dims(data_norm, axis=0), axis=-1)
-                            
-                            # Apply model for super-resolution
-                            print("Running SRCNN model for super-resolution...")
-                            data_sr = model.predict(data_input, verbose=0)[0, :, :, 0]
-                            print(f"Super-resolution complete: Input shape {data_input.shape} → Output shape {data_sr.shape}")
-                            
-                            # Scale back
-                            if data_max != data_min:
-                                raster_data = (data_sr * (data_max - data_min) + data_min).astype(np.float32)
-                            else:
-                                raster_data = np.full_like(data_sr, data_min, dtype=np.float32)
-                        except Exception as e:
-                            print(f"Error in super-resolution: {e}")
-                            print(traceback.format_exc())
-                            
-                    else:
-                        if zoom_level >= 12 and not MODEL_LOADED:
-                            print("Super-resolution not applied: Model not loaded")
-                        elif zoom_level >= 12 and not use_super_resolution:
-                            print("Super-resolution not applied: Area too large")
-                        else:
-                            print(f"Super-resolution not needed at zoom level {zoom_level}")
-                    
-                    # Sample points for the response
-                    # The higher the zoom level, the more points we include
-                    sample_rate = max(1, int(raster_data.shape[0] * raster_data.shape[1] / (500 * zoom_level / 10)))
-                    
-                    features = []
-                    for i in range(0, raster_data.shape[0], sample_rate):
-                        for j in range(0, raster_data.shape[1], sample_rate):
-                            if i < raster_data.shape[0] and j < raster_data.shape[1]:
-                                try:
-                                    # Get pixel value
-                                    value = float(raster_data[i, j])
-                                    
-                                    # Skip NaN values
-                                    if np.isnan(value):
-                                        continue
-                                    
-                                    # Convert to AQI scale (0-500)
-                                    aqi = min(500, max(0, int(value * 500 / 255)))
-                                    
-                                    # Get coordinates
-                                    lon, lat = pixel_to_geo(row_min + i, col_min + j)
-                                    
-                                    features.append({
-                                        "type": "Feature",
-                                        "properties": {
-                                            "aqi": aqi,
-                                            "color": get_aqi_color(aqi),
-                                            "is_model_data": True
-                                        },
-                                        "geometry": {
-                                            "type": "Point",
-                                            "coordinates": [lon, lat]
-                                        }
-                                    })
-                                except Exception as e:
-                                    print(f"Error processing point at ({i},{j}): {e}")
-                                    continue
+                    raster_data = super_resolve_window(snapshot, row_min, row_max, col_min, col_max)
+                    super_resolved = True
+                except Exception as e:
+                    logger.exception("Error in super-resolution: %s", e)
+                    # The ETag promised a super-resolved body
+                    g.pop('response_cache_key', None)
                     
-                    # If we have no features (maybe all NaNs), return appropriate error
-                    if not features:
-                        print("No valid features found in raster data")
+            else:
+                if zoom_level >= 12 and not MODEL_LOADED:
+                    logger.debug("Super-resolution not applied: Model not loaded")
+                elif zoom_level >= 12 and not use_super_resolution:
+                    logger.debug("Super-resolution not applied: Area too large")
+                else:
+                    logger.debug("Super-resolution not needed at zoom level %s", zoom_level)
+            if super_resolved:
+                # SR_SCALE pixels per source pixel: the same stride in source
+                # pixels keeps the point count of the source window
+                sample_rate *= SR_SCALE
+                to_pixel = lambda rows, cols: ((row_min * SR_SCALE + np.asarray(rows) + 0.5) / SR_SCALE - 0.5,
+                                               (col_min * SR_SCALE + np.asarray(cols) + 0.5) / SR_SCALE - 0.5)
+            
+            if interpolation:
+                # Resampled in one pass onto the requested grid, every cell is returned
+                with metrics.stage('interpolate'):
+                    raster_data, to_pixel = interpolate_window(raster_data, to_pixel, grid_size, interpolation)
+                sample_rate = 1
+            elif not super_resolved and snapshot.overviews:
+                # Sparse sampling: read pre-averaged pixels from a COG overview instead
+                with metrics.stage('window'):
+                    raster_data, sample_rate, to_pixel = read_overview_window(
+                        snapshot, row_min, row_max, col_min, col_max, sample_rate
+                    )
+            
+            metadata = {
+                "used_model": sr_product is not None or (MODEL_LOADED and zoom_level >= 12 and use_super_resolution),
+                "sr_product": sr_product is not None,
+                "sr_scale": SR_SCALE if super_resolved else 1,
+                "zoom_level": zoom_level,
+                "real_data": True
+            }
+            if catalog_entry is not None:
+                metadata["raster"] = raster_metadata(catalog_entry)
+            if interpolation:
+                metadata["interpolation"] = {
+                    "method": interpolation,
+                    "width": raster_data.shape[1],
+                    "height": raster_data.shape[0]
+                }
+            
+            if response_format == 'grid':
+                # Every sampled pixel, georeferenced by origin and step instead of per point
+                with metrics.stage('features'):
+                    sampled = raster_data[::sample_rate, ::sample_rate]
+                    valid = np.isfinite(sampled)
+                    if not valid.any():
+                        logger.debug("No valid features found in raster data")
                         return jsonify({"error": "No valid data points in selected region"}), 400
-                    
-                    return jsonify({
-                        "type": "FeatureCollection",
-                        "features": features,
-                        "metadata": {
-                            "used_model": MODEL_LOADED and zoom_level >= 12 and use_super_resolution,
-                            "zoom_level": zoom_level,
-                            "real_data": True
-                        }
-                    })
-                except Exception as e:
-                    print(f"Error processing raster: {e}")
-                    print(traceback.format_exc())
-                    return jsonify({"error": f"Error processing raster data: {str(e)}"}), 500
-        except Exception as e:
-            print(f"Error opening GeoTIFF: {e}")
-            print(traceback.format_exc())
-            return jsonify({"error": f"Error opening GeoTIFF file: {str(e)}"}), 500
+                    xs, ys = pixel_to_geo_array(*to_pixel([0, sample_rate], [0, sample_rate]), snapshot)
+                    grid = formats.aqi_grid(values_to_aqi(sampled[valid]), valid)
+                with metrics.stage('serialize'):
+                    body = formats.encode_grid(grid, (xs[0], ys[0]), (xs[1] - xs[0], ys[1] - ys[0]))
+                return binary_response(body, response_format, metadata)
+            
+            sampled_points = -(-raster_data.shape[0] // sample_rate) * -(-raster_data.shape[1] // sample_rate)
+            if response_format == 'geojson' and (data.get('stream') or sampled_points >= STREAM_MIN_POINTS):
+                if not np.isfinite(raster_data[::sample_rate, ::sample_rate]).any():
+                    logger.debug("No valid features found in raster data")
+                    return jsonify({"error": "No valid data points in selected region"}), 400
+                logger.debug("Streaming up to %d features", sampled_points)
+                return Response(
+                    stream_feature_collection(snapshot, raster_data, sample_rate, to_pixel, metadata),
+                    mimetype='application/json'
+                )
+            
+            # Sample, scale and georeference the whole grid at once
+            with metrics.stage('features'):
+                values, rows, cols = sample_grid(raster_data, sample_rate)
+                aqi = values_to_aqi(values)
+                lons, lats = pixel_to_geo_array(*to_pixel(rows, cols), snapshot)
+                if response_format == 'geojson':
+                    features = build_features(lons, lats, aqi, {"is_model_data": True})
             
+            if response_format in ('columnar', 'arrow'):
+                if aqi.size == 0:
+                    logger.debug("No valid features found in raster data")
+                    return jsonify({"error": "No valid data points in selected region"}), 400
+                encode = formats.encode_arrow if response_format == 'arrow' else formats.encode_columnar
+                with metrics.stage('serialize'):
+                    body = encode(lons, lats, aqi)
+                return binary_response(body, response_format, metadata)
+            
+            # If we have no features (maybe all NaNs), return appropriate error
+            if not features:
+                logger.debug("No valid features found in raster data")
+                return jsonify({"error": "No valid data points in selected region"}), 400
+            
+            with metrics.stage('serialize'):
+                return jsonify({
+                    "type": "FeatureCollection",
+                    "features": features,
+                    "metadata": metadata
+                })
+        except Exception as e:
+            logger.exception("Error processing raster: %s", e)
+            return jsonify({"error": f"Error processing raster data: {str(e)}"}), 500
     except Exception as e:
-        print(f"Unhandled exception in get_air_quality: {e}")
-        print(traceback.format_exc())
+        logger.exception("Unhandled exception in get_air_quality: %s", e)
         return jsonify({"error": f"Unhandled server error: {str(e)}"}), 500
 
+@app.route('/api/query_points', methods=['POST'])
+def query_points():
+    """AQI at many lon/lat points at once.
+
+    Takes JSON {"points": [[lon, lat], ...]} or {"lons": [...], "lats": [...]},
+    or a binary body of float32 (lon, lat) pairs (see formats.POINTS_MIMETYPE)
+    with the other parameters in the query string. Optional parameters are
+    "interpolation" (nearest or bilinear), "date", "pollutant" and "format"
+    ("binary" for uint16 AQI values instead of JSON).
+    """
+    try:
+        if request.mimetype == formats.POINTS_MIMETYPE:
+            params = request.args
+            try:
+                lons, lats = formats.decode_points(request.get_data())
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            params = request.get_json(silent=True) or {}
+            try:
+                if 'points' in params:
+                    pairs = np.asarray(params['points'], dtype=np.float64).reshape(-1, 2)
+                    lons, lats = pairs[:, 0], pairs[:, 1]
+                else:
+                    lons = np.asarray(params.get('lons', []), dtype=np.float64).ravel()
+                    lats = np.asarray(params.get('lats', []), dtype=np.float64).ravel()
+            except (TypeError, ValueError):
+                return jsonify({"error": "Points must be [lon, lat] pairs or equal-length lons and lats"}), 400
+            if lons.shape != lats.shape:
+                return jsonify({"error": "lons and lats must have the same length"}), 400
+
+        interpolation = params.get('interpolation', 'nearest')
+        if interpolation not in points.INTERPOLATIONS:
+            return jsonify({"error": f"Unknown interpolation {interpolation!r}, expected one of {points.INTERPOLATIONS}"}), 400
+        if len(lons) > QUERY_MAX_POINTS:
+            return jsonify({"error": f"At most {QUERY_MAX_POINTS} points per request"}), 413
+        binary = params.get('format') == 'binary' or (
+            request.accept_mimetypes.best_match(['application/json', formats.POINT_VALUES_MIMETYPE]) ==
+            formats.POINT_VALUES_MIMETYPE)
+
+        finite = np.isfinite(lons) & np.isfinite(lats)
+        lonlat_bounds = ((lons[finite].min(), lats[finite].min(), lons[finite].max(), lats[finite].max())
+                         if finite.any() else None)
+        try:
+            catalog_entry = find_catalog_entry(params, lonlat_bounds)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        if catalog_entry is None and not GEOTIFF_EXISTS:
+            return jsonify({"error": "GeoTIFF file not available"}), 404
+
+        snapshot = get_snapshot(catalog_entry)
+        values = points.sample_points(snapshot, lons, lats, interpolation)
+        valid = np.isfinite(values)
+        aqi = np.zeros(values.shape, dtype=np.int64)
+        aqi[valid] = values_to_aqi(values[valid])
+
+        metadata = {"count": int(len(aqi)), "valid": int(valid.sum()), "interpolation": interpolation}
+        if catalog_entry is not None:
+            metadata["raster"] = raster_metadata(catalog_entry)
+
+        if binary:
+            response = Response(formats.encode_point_values(aqi, valid), mimetype=formats.POINT_VALUES_MIMETYPE)
+            response.headers['X-AQI-Metadata'] = json.dumps(metadata)
+            return response
+
+        aqi_list = aqi.tolist()
+        for i in np.flatnonzero(~valid).tolist():
+            aqi_list[i] = None
+        return jsonify(dict(metadata, aqi=aqi_list))
+    except Exception as e:
+        logger.exception("Error in query_points: %s", e)
+        return jsonify({"error": f"Error querying points: {str(e)}"}), 500
+
+@app.route('/api/region_stats', methods=['POST'])
+def region_stats():
+    """AQI count, mean, min, max and category histogram over a bbox or polygon.
+
+    Takes {"bbox": [west, south, east, north]} or {"geometry": <GeoJSON
+    Polygon, MultiPolygon or Feature>, "polygon_id": "..."}, plus optional
+    "percentiles" (e.g. [50, 90]), "date" and "pollutant". A polygon_id must
+    always name the same geometry; its mask is cached under that id.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        geometry = data.get('geometry')
+        polygon_id = data.get('polygon_id')
+        if isinstance(geometry, dict) and geometry.get('type') == 'Feature':
+            polygon_id = polygon_id or geometry.get('id')
+            geometry = geometry.get('geometry')
+
+        if geometry is not None:
+            if not isinstance(geometry, dict) or geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+                return jsonify({"error": "geometry must be a GeoJSON Polygon, MultiPolygon or Feature"}), 400
+            try:
+                lons, lats = zip(*(point for ring in _geometry_rings(geometry) for point in ring))
+                lonlat_bounds = (min(lons), min(lats), max(lons), max(lats))
+            except (TypeError, ValueError):
+                return jsonify({"error": "Invalid polygon coordinates"}), 400
+        else:
+            bbox = data.get('bbox')
+            if (not isinstance(bbox, list) or len(bbox) != 4 or
+                    not all(isinstance(v, (int, float)) for v in bbox) or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]):
+                return jsonify({"error": "Expected bbox [west, south, east, north] or a GeoJSON geometry"}), 400
+            lonlat_bounds = tuple(bbox)
+
+        qs = data.get('percentiles') or []
+        if not isinstance(qs, list) or not all(isinstance(q, (int, float)) and 0 <= q <= 100 for q in qs):
+            return jsonify({"error": "percentiles must be a list of numbers between 0 and 100"}), 400
+
+        try:
+            catalog_entry = find_catalog_entry(data, lonlat_bounds)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        if catalog_entry is None and not GEOTIFF_EXISTS:
+            return jsonify({"error": "GeoTIFF file not available"}), 404
+        snapshot = get_snapshot(catalog_entry)
+
+        mask = None
+        if geometry is not None:
+            mask_key = ('mask', polygon_id or hashlib.sha1(json.dumps(geometry, sort_keys=True).encode()).hexdigest(),
+                        tuple(snapshot.transform), snapshot.data.shape)
+            cached = region_cache.get(mask_key + ('window',))
+            mask = region_cache.get(mask_key)
+            if cached is not None and mask is not None:
+                window = tuple(int(v) for v in cached)
+            else:
+                try:
+                    window, mask = zonal.polygon_mask(geometry, snapshot)
+                except Exception as e:
+                    return jsonify({"error": f"Invalid polygon: {str(e)}"}), 400
+                if window is not None:
+                    region_cache.put(mask_key, mask)
+                    region_cache.put(mask_key + ('window',), np.array(window))
+            tables = None
+            method = "polygon_mask"
+        else:
+            window = zonal.bbox_window(lonlat_bounds, snapshot)
+            tables = get_summed_area_tables(snapshot)
+            method = "summed_area_table" if tables is not None else "window"
+
+        if window is None:
+            stats = zonal.summarize(0, 0, [0] * len(zonal.AQI_COLORS), None, None)
+        else:
+            row_min, row_max, col_min, col_max = window
+            raster_data = raster_store.window(row_min, row_max, col_min, col_max, snapshot)
+            if mask is None:
+                mask = np.ones(raster_data.shape, dtype=bool) if tables is None else None
+            if method == "summed_area_table":
+                stats = zonal.box_stats(*tables, snapshot.data, row_min, row_max, col_min, col_max)
+            else:
+                stats = zonal.masked_stats(raster_data, mask)
+            if qs:
+                stats["percentiles"] = zonal.percentiles(raster_data, mask, qs)
+
+        stats["method"] = method
+        if catalog_entry is not None:
+            stats["raster"] = raster_metadata(catalog_entry)
+        return jsonify(stats)
+    except Exception as e:
+        logger.exception("Error in region_stats: %s", e)
+        return jsonify({"error": f"Error computing region statistics: {str(e)}"}), 500
+
+
+def _geometry_rings(geometry):
+    """Every linear ring of a GeoJSON Polygon or MultiPolygon"""
+    if geometry['type'] == 'Polygon':
+        return geometry['coordinates']
+    return [ring for polygon in geometry['coordinates'] for ring in polygon]
+
 def generate_aqi_data(lat_min, lat_max, lon_min, lon_max, zoom_level):
     """Generate AQI data for a given region"""
     try:
@@ -353,7 +1074,7 @@ def generate_aqi_data(lat_min, lat_max, lon_min, lon_max, zoom_level):
         grid_size = int(5 + zoom_level / 2)
         grid_size = min(max(grid_size, 5), 30)  # Keep grid size reasonable
         
-        print(f"Grid size: {grid_size}x{grid_size} for zoom level {zoom_level}")
+        logger.debug("Grid size: %dx%d for zoom level %s", grid_size, grid_size, zoom_level)
         
         for i in range(grid_size):
             for j in range(grid_size):
@@ -378,7 +1099,7 @@ def generate_aqi_data(lat_min, lat_max, lon_min, lon_max, zoom_level):
                         }
                     })
                 except Exception as e:
-                    print(f"Error generating point: {e}")
+                    logger.debug("Error generating point: %s", e)
                     continue
         
         # Fallback - if no points were generated, create at least one
@@ -397,7 +1118,7 @@ def generate_aqi_data(lat_min, lat_max, lon_min, lon_max, zoom_level):
                 }
             })
         
-        print(f"Generated {len(features)} data points")
+        logger.debug("Generated %d data points", len(features))
         
         return jsonify({
             "type": "FeatureCollection",
@@ -408,8 +1129,7 @@ def generate_aqi_data(lat_min, lat_max, lon_min, lon_max, zoom_level):
             }
         })
     except Exception as e:
-        print(f"Error in generate_aqi_data: {e}")
-        print(traceback.format_exc())
+        logger.exception("Error in generate_aqi_data: %s", e)
         # Ultimate fallback - hardcoded response
         return jsonify({
             "type": "FeatureCollection",
@@ -433,42 +1153,198 @@ def generate_aqi_data(lat_min, lat_max, lon_min, lon_max, zoom_level):
 
 @app.route('/api/get_forecast', methods=['POST'])
 def get_forecast():
-    # This would typically connect to a forecasting model
-    # But we did not implement it 
+    """Forecast AQI per step at {"latitude", "longitude"} or averaged over {"bbox": [west, south, east, north]}.
+
+    Optional "pollutant" (default NO2). Without a location the default bounds
+    are used. Falls back to fixed values while no forecast covers the request.
+    """
     try:
+        data = request.get_json(silent=True) or {}
+        bbox = data.get('bbox')
+        if bbox is not None:
+            if (not isinstance(bbox, list) or len(bbox) != 4 or
+                    not all(isinstance(v, (int, float)) for v in bbox) or bbox[0] > bbox[2] or bbox[1] > bbox[3]):
+                return jsonify({"error": "Expected bbox [west, south, east, north]"}), 400
+            lonlat_bounds = tuple(bbox)
+        elif data.get('latitude') is not None or data.get('longitude') is not None:
+            try:
+                lat, lon = float(data['latitude']), float(data['longitude'])
+            except (KeyError, TypeError, ValueError):
+                return jsonify({"error": "Expected numeric latitude and longitude"}), 400
+            lonlat_bounds = (lon, lat, lon, lat)
+        else:
+            lonlat_bounds = DEFAULT_BOUNDS
+        pollutant = data.get('pollutant') or DEFAULT_POLLUTANT
+        if not isinstance(pollutant, str):
+            return jsonify({"error": "Invalid pollutant parameter"}), 400
+
+        snapshot = get_forecast_snapshot(pollutant)
+        values = forecast.window_values(snapshot, lonlat_bounds) if snapshot is not None else None
+        if values is None or not np.isfinite(values).any():
+            return jsonify({"forecast": FALLBACK_FORECAST, "source": "fallback"})
+
+        days = []
+        for timestamp, value in zip(snapshot.timestamps, values):
+            aqi = int(values_to_aqi(value)) if np.isfinite(value) else None
+            days.append({
+                "day": timestamp.strftime('%a %d %b'),
+                "date": timestamp.isoformat(),
+                "aqi": aqi,
+                "color": get_aqi_color(aqi) if aqi is not None else None
+            })
         return jsonify({
-            "forecast": [
-                {"day": "Today", "aqi": 120, "color": "#FF7E00"},
-                {"day": "Tomorrow", "aqi": 150, "color": "#FF7E00"},
-                {"day": "Day 3", "aqi": 180, "color": "#FF0000"}
-            ]
+            "forecast": days,
+            "source": "model",
+            "method": snapshot.method,
+            "issued": snapshot.issued.isoformat()
         })
     except Exception as e:
-        print(f"Error in get_forecast: {e}")
-        # Fallback
-        return jsonify({
-            "forecast": [
-                {"day": "Today", "aqi": 120, "color": "#FF7E00"},
-                {"day": "Tomorrow", "aqi": 150, "color": "#FF7E00"},
-                {"day": "Day 3", "aqi": 180, "color": "#FF0000"}
-            ]
-        })
+        logger.exception("Error in get_forecast: %s", e)
+        return jsonify({"forecast": FALLBACK_FORECAST, "source": "fallback"})
+
+
+def get_forecast_snapshot(pollutant):
+    """Resident bands of a pollutant's forecast, or None if it hasn't been built"""
+    path = forecast.forecast_path(FORECAST_DIR, normalize_pollutant(pollutant))
+    with forecast_lock:
+        store = forecast_stores.get(path)
+        if store is None:
+            store = forecast_stores[path] = forecast.ForecastStore(path)
+    return store.get()
+
+@app.route('/api/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@app.route('/api/tiles/<int:z>/<int:x>/<int:y>.<fmt>', methods=['GET'])
+def get_tile(z, x, y, fmt='png'):
+    """Serve an AQI map tile as PNG or a raw uint16 grid (.bin)"""
+    if fmt not in tiles.TILE_FORMATS or not tiles.tile_exists(z, x, y):
+        return jsonify({"error": "Tile not found"}), 404
+    if not GEOTIFF_EXISTS:
+        return jsonify({"error": "GeoTIFF file not available"}), 404
+
+    try:
+        snapshot = raster_store.get()
+        # The URL doesn't change with the raster, so clients revalidate against its version
+        etag = f"{snapshot.version}-{z}-{x}-{y}.{fmt}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.set_etag(etag, weak=True)
+            return response
+        data, cached = tiles.get_or_render_tile(tile_cache, raster_store.path, snapshot, z, x, y, fmt)
+    except Exception as e:
+        logger.exception("Error rendering tile %s/%s/%s.%s: %s", z, x, y, fmt, e)
+        return jsonify({"error": f"Error rendering tile: {str(e)}"}), 500
+
+    response = Response(data, mimetype=tiles.TILE_FORMATS[fmt])
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag, weak=True)
+    response.headers['X-Tile-Cache'] = 'hit' if cached else 'miss'
+    if fmt == 'bin':
+        response.headers['X-AQI-Nodata'] = str(tiles.GRID_NODATA)
+    return response
 
 # Basic test endpoint
 @app.route('/api/test', methods=['GET'])
 def test_endpoint():
     return jsonify({"status": "ok", "message": "Server is running"})
 
+# Liveness is /api/test, which answers as soon as the module is imported.
+# Readiness is /api/model_status, which returns 503 until warm-up has finished.
 @app.route('/api/model_status', methods=['GET'])
 def model_status():
     """Return the status of the model and data files"""
-    return jsonify({
+    response = jsonify({
+        "ready": MODEL_READY,
         "model_loaded": MODEL_LOADED,
+        "inference_backend": INFERENCE_BACKEND,
         "geotiff_exists": GEOTIFF_EXISTS,
         "model_path": model_path,
-        "geotiff_path": GEOTIFF_PATH
+        "geotiff_path": GEOTIFF_PATH,
+        "raster_store": raster_store.memory_info(),
+        "startup": dict(STARTUP_TIMINGS, import_seconds=IMPORT_SECONDS),
+        "warm_up_error": WARM_UP_ERROR,
+        "worker_pid": os.getpid()
+    })
+    return response if MODEL_READY else (response, 503)
+
+@app.route('/api/catalog', methods=['GET'])
+def catalog():
+    """Return the pollutants and time ranges available by date"""
+    try:
+        return jsonify(raster_catalog.summary())
+    except Exception as e:
+        logger.error("Error reading raster catalog: %s", e)
+        return jsonify({"error": f"Error reading raster catalog: {str(e)}"}), 500
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Observe request latency and report the request's stage timings in Server-Timing"""
+    started = g.get('request_started')
+    if started is not None:
+        metrics.REQUEST_SECONDS.labels(request.endpoint or 'unknown', response.status_code).observe(
+            time.perf_counter() - started)
+    timings = metrics.stage_timings()
+    if timings:
+        response.headers['Server-Timing'] = metrics.server_timing(timings)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s stages %s", request.endpoint, json.dumps({
+                name: round(seconds * 1000, 3) for name, seconds in timings.items()
+            }))
+    return response
+
+
+@app.after_request
+def compress_air_quality_response(response):
+    """Compress a get_air_quality body once, tag it with its ETag and keep it for repeat requests.
+
+    Streamed bodies are tagged and compressed as they are sent, but not kept.
+    """
+    key = g.pop('response_cache_key', None)
+    if key is None or response.status_code != 200:
+        return response
+    etag, encoding = key
+    if response.is_streamed:
+        # Too big to keep, so compressed on the way out and revalidated by ETag only
+        response.response = compression.compress_chunks(response.iter_encoded(), encoding)
+        return tag_response(response, {"encoding": encoding}, etag)
+    with metrics.stage('compress'):
+        body = response.get_data()
+        headers = {
+            "mimetype": response.mimetype,
+            "encoding": encoding if len(body) >= compression.MIN_SIZE else 'identity',
+            "metadata": response.headers.get('X-AQI-Metadata')
+        }
+        body = compression.compress(body, headers["encoding"])
+    header_json = json.dumps(headers).encode()
+    response_cache.put(key, struct.pack('<I', len(header_json)) + header_json + body)
+
+    response.set_data(body)
+    response.headers['X-AQI-Cache'] = 'miss'
+    return tag_response(response, headers, etag)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus exposition of request and stage latency histograms"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Return cache and inference counters"""
+    return jsonify({
+        "sr_cache": sr_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "inference": inference_scheduler.stats()
     })
 
+IMPORT_SECONDS = round(time.time() - STARTED_AT, 3)
+threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
 if __name__ == '__main__':
-    init_geotiff()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""SRCNN throughput under concurrent requests, direct model.predict vs InferenceScheduler.
+
+Each simulated request super-resolves one small window (a single tile), which
+is the common case for zoomed-in map views. With --mixed every client's window
+has a different shape, as with real bboxes, and the scheduler is run both
+without padding (--max-pad-ratio 1) and with it. Run from the Backend directory:
+
+    python benchmarks/bench_batching.py --clients 1 4 16 --tile 64 --mixed
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from srcnn import build_srcnn_model, InferenceScheduler  # noqa: E402
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'model', 'srcnn_model.h5')
+
+
+def client_shapes(clients, tile, mixed):
+    """(height, width) of each client's window: all tile x tile, or all different within [tile/2, tile]"""
+    if not mixed:
+        return [(tile, tile)] * clients
+    rng = np.random.default_rng(1)
+    return [tuple(int(edge) for edge in rng.integers(tile // 2, tile + 1, 2)) for _ in range(clients)]
+
+
+def run_load(predict_fn, shapes, requests_per_client):
+    """Return requests per second with one thread per shape each issuing requests back to back"""
+    rng = np.random.default_rng(0)
+    clients = len(shapes)
+    inputs = [rng.random((1, height, width, 1)).astype(np.float32) for height, width in shapes]
+    barrier = threading.Barrier(clients + 1)
+
+    def client(index):
+        barrier.wait()
+        for _ in range(requests_per_client):
+            predict_fn(inputs[index])
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return clients * requests_per_client / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=20, help='Requests per client')
+    parser.add_argument('--tile', type=int, default=64, help='Window edge length in pixels')
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--max-pad-ratio', type=float, default=4.0)
+    parser.add_argument('--mixed', action='store_true', help='Give every client a differently shaped window')
+    args = parser.parse_args()
+
+    model = build_srcnn_model()
+    if os.path.exists(MODEL_PATH):
+        model.load_weights(MODEL_PATH)
+
+    def direct(batch):
+        return model.predict(batch, batch_size=len(batch), verbose=0)
+
+    # Warm up graph tracing for the batch sizes used below
+    for size in (1, args.max_batch):
+        direct(np.zeros((size, args.tile, args.tile, 1), dtype=np.float32))
+
+    pad_ratios = [1.0, args.max_pad_ratio] if args.mixed else [args.max_pad_ratio]
+    print(f"{'clients':>8} {'pad ratio':>10} {'direct req/s':>13} {'batched req/s':>14} {'speedup':>8} "
+          f"{'mean batch':>11} {'padded':>7}")
+    for clients in args.clients:
+        shapes = client_shapes(clients, args.tile, args.mixed)
+        direct_rps = run_load(direct, shapes, args.requests)
+        for pad_ratio in pad_ratios:
+            scheduler = InferenceScheduler(direct, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                                           max_pad_ratio=pad_ratio)
+            batched_rps = run_load(scheduler.predict, shapes, args.requests)
+            stats = scheduler.stats()
+            print(f"{clients:>8} {pad_ratio:>10.1f} {direct_rps:>13.1f} {batched_rps:>14.1f} "
+                  f"{batched_rps / direct_rps:>7.1f}x {stats['mean_batch_size']:>11.1f} "
+                  f"{stats['padded_tiles'] / max(stats['tiles'], 1):>6.0%}")
+
+
+if __name__ == '__main__':
+    main()
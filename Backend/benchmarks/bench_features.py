@@ -0,0 +1,84 @@
+"""Points per second for GeoJSON feature construction, per-pixel loop vs vectorized.
+
+Run from the Backend directory:
+
+    python benchmarks/bench_features.py --sizes 100 300 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from features import get_aqi_color, values_to_aqi, sample_grid, build_features  # noqa: E402
+
+TRANSFORM = from_origin(705000.0, 3200000.0, 100.0, 100.0)
+
+
+def legacy_features(raster_data, row_min, col_min, sample_rate):
+    """The original per-pixel loop from get_air_quality"""
+    features = []
+    for i in range(0, raster_data.shape[0], sample_rate):
+        for j in range(0, raster_data.shape[1], sample_rate):
+            value = float(raster_data[i, j])
+            if np.isnan(value):
+                continue
+            aqi = min(500, max(0, int(value * 500 / 255)))
+            lon, lat = rasterio.transform.xy(TRANSFORM, row_min + i, col_min + j)
+            features.append({
+                "type": "Feature",
+                "properties": {"aqi": aqi, "color": get_aqi_color(aqi), "is_model_data": True},
+                "geometry": {"type": "Point", "coordinates": [lon, lat]}
+            })
+    return features
+
+
+def vectorized_features(raster_data, row_min, col_min, sample_rate):
+    values, rows, cols = sample_grid(raster_data, sample_rate)
+    aqi = values_to_aqi(values)
+    rows = row_min + rows + 0.5
+    cols = col_min + cols + 0.5
+    lons = TRANSFORM.a * cols + TRANSFORM.b * rows + TRANSFORM.c
+    lats = TRANSFORM.d * cols + TRANSFORM.e * rows + TRANSFORM.f
+    return build_features(lons, lats, aqi, {"is_model_data": True})
+
+
+def best_time(fn, *args, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 300, 1000],
+                        help='Window edge lengths in pixels')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'window':>10} {'points':>9} {'loop pts/s':>12} {'vector pts/s':>13} {'speedup':>8}")
+    for size in args.sizes:
+        raster = rng.uniform(0, 255, (size, size)).astype(np.float32)
+        raster[rng.random((size, size)) < 0.05] = np.nan
+
+        loop_time, expected = best_time(legacy_features, raster, 10, 20, 1, repeat=args.repeat)
+        vec_time, actual = best_time(vectorized_features, raster, 10, 20, 1, repeat=args.repeat)
+        if actual != expected:
+            raise SystemExit(f"Vectorized output differs from the loop for {size}x{size}")
+
+        points = len(actual)
+        print(f"{size:>4}x{size:<5} {points:>9} {points / loop_time:>12,.0f} "
+              f"{points / vec_time:>13,.0f} {loop_time / vec_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
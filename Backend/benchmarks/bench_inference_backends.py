@@ -0,0 +1,59 @@
+"""SRCNN latency per inference backend across window sizes, with an equivalence check.
+
+Run from the Backend directory:
+
+    python benchmarks/bench_inference_backends.py --sizes 64 128 256 512
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from srcnn import build_srcnn_model, make_predict_fn, max_abs_difference, INFERENCE_BACKENDS  # noqa: E402
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'model', 'srcnn_model.h5')
+
+
+def median_latency(predict_fn, batch, repeat):
+    predict_fn(batch)  # warm-up: tracing, interpreter allocation
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict_fn(batch)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 128, 256, 512],
+                        help='Window edge lengths in pixels')
+    parser.add_argument('--backends', nargs='+', default=list(INFERENCE_BACKENDS), choices=INFERENCE_BACKENDS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    model = build_srcnn_model()
+    if os.path.exists(MODEL_PATH):
+        model.load_weights(MODEL_PATH)
+
+    reference = make_predict_fn(model, 'keras')
+    predictors = {}
+    for backend in args.backends:
+        predictors[backend] = make_predict_fn(model, backend)
+        difference = max_abs_difference(predictors[backend], reference)
+        print(f"{backend:>12}: max abs difference vs keras {difference:.2e}")
+
+    print()
+    print(f"{'window':>10} " + " ".join(f"{backend + ' ms':>15}" for backend in args.backends))
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        batch = rng.random((1, size, size, 1)).astype(np.float32)
+        latencies = [median_latency(predictors[backend], batch, args.repeat) * 1000 for backend in args.backends]
+        print(f"{size:>4}x{size:<5} " + " ".join(f"{latency:>15.1f}" for latency in latencies))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Raster read time versus zoom level, full-resolution reads vs COG overview reads.
+
+For each zoom level a view centred on a synthetic raster is read the way
+get_air_quality samples it: a full-resolution window thinned by sample_rate
+from a plain GeoTIFF, a decimated out_shape read of the same window from the
+COG (served by GDAL from its overviews), and a slice of the resident overview
+held by RasterStore. Run from the Backend directory:
+
+    python benchmarks/bench_overviews.py --size 4000 --zooms 8 9 10 11 12
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from cog import convert  # noqa: E402
+from raster_store import RasterStore, overview_level  # noqa: E402
+from fixtures import write_geotiff  # noqa: E402
+
+
+def view_window(size, zoom):
+    """Centred window covering the whole raster at zoom 10 and halving in each direction per zoom level"""
+    edge = max(1, min(size, int(size * 2 ** (10 - zoom))))
+    start = (size - edge) // 2
+    return start, start + edge
+
+
+def sample_rate_for(edge, zoom):
+    # Same formula as get_air_quality
+    return max(1, int(edge * edge / (500 * zoom / 10)))
+
+
+def full_read(path, start, stop, sample_rate):
+    with rasterio.open(path) as src:
+        data = src.read(1, window=Window(start, start, stop - start, stop - start))
+    return data[::sample_rate, ::sample_rate]
+
+
+def cog_read(path, start, stop, sample_rate):
+    with rasterio.open(path) as src:
+        factor = max((f for f in src.overviews(1) if f <= sample_rate), default=1)
+        edge = math.ceil((stop - start) / factor)
+        data = src.read(1, window=Window(start, start, stop - start, stop - start), out_shape=(edge, edge))
+    step = max(1, round(sample_rate / factor))
+    return data[::step, ::step]
+
+
+def resident_read(snapshot, start, stop, sample_rate):
+    factor, level = overview_level(snapshot, sample_rate)
+    step = max(1, round(sample_rate / factor))
+    return np.array(level[start // factor:math.ceil(stop / factor):step, start // factor:math.ceil(stop / factor):step])
+
+
+def median_seconds(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=4000, help='Raster edge length in pixels')
+    parser.add_argument('--zooms', type=int, nargs='+', default=[8, 9, 10, 11, 12])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_path = write_geotiff(os.path.join(tmp, 'plain.tif'), args.size)
+        cog_path = os.path.join(tmp, 'plain.cog.tif')
+        factors = convert(plain_path, cog_path)
+        snapshot = RasterStore(cog_path).get()
+        print(f"{args.size}x{args.size} raster, overviews {factors}")
+        print()
+
+        print(f"{'zoom':>4} {'window':>11} {'sample':>6} {'level':>5} {'full ms':>8} {'cog ms':>8} "
+              f"{'resident ms':>12} {'points':>7}")
+        for zoom in args.zooms:
+            start, stop = view_window(args.size, zoom)
+            sample_rate = sample_rate_for(stop - start, zoom)
+            factor, _ = overview_level(snapshot, sample_rate)
+            full = median_seconds(lambda: full_read(plain_path, start, stop, sample_rate), args.repeat)
+            cog = median_seconds(lambda: cog_read(cog_path, start, stop, sample_rate), args.repeat)
+            resident = median_seconds(lambda: resident_read(snapshot, start, stop, sample_rate), args.repeat)
+            points = resident_read(snapshot, start, stop, sample_rate).size
+            print(f"{zoom:>4} {stop - start:>5}x{stop - start:<5} {sample_rate:>6} {'1/' + str(factor):>5} "
+                  f"{full * 1000:>8.1f} {cog * 1000:>8.1f} {resident * 1000:>12.3f} {points:>7}")
+
+
+if __name__ == '__main__':
+    main()
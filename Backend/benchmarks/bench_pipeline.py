@@ -0,0 +1,231 @@
+"""End-to-end get_air_quality timings per stage on synthetic rasters, with a regression check.
+
+For each raster size a synthetic GeoTIFF (see fixtures.py) is written and a
+fresh interpreter imports app.py with AQI_GEOTIFF_PATH pointing at it and the
+result caches switched off. Requests go through the Flask test client for
+every zoom level, bbox span and format, and the per-stage timings are read
+from each response's Server-Timing header. Run from the Backend directory:
+
+    python benchmarks/bench_pipeline.py --sizes 600 2000 4000 --output bench.json
+
+SRCNN uses model/srcnn_model.h5 when it exists and randomly initialized
+weights (seeded, so runs compare) otherwise, or always with --random-weights;
+the timings don't depend on what the weights have learned. Compare against
+an earlier run with --baseline bench.json: any case or stage more than
+--threshold slower makes the script exit with status 1, unless the slowdown
+is within the noise of the repeats (see regressions).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+from fixtures import write_geotiff  # noqa: E402
+
+# Centre of the fixtures' extent
+CENTER_LON, CENTER_LAT = 77.2, 28.6
+
+# Timings below MIN_STAGE_MS in the baseline aren't compared. A slowdown must also
+# add MIN_DELTA_MS and NOISE_MADS times the larger median absolute deviation of
+# the two runs' repeats to count
+MIN_STAGE_MS = 1.0
+MIN_DELTA_MS = 1.0
+NOISE_MADS = 3.0
+
+PROBE = r'''
+import json, struct, sys, time
+import numpy as np
+import app
+
+cases = json.loads(sys.argv[1])
+repeat = int(sys.argv[2])
+while not app.MODEL_READY:
+    time.sleep(0.05)
+client = app.app.test_client()
+
+
+def mad(samples):
+    return float(np.median(np.abs(np.asarray(samples) - np.median(samples))))
+
+
+def stages(header):
+    timings = {}
+    for item in filter(None, (part.strip() for part in header.split(','))):
+        name, _, duration = item.partition(';dur=')
+        timings[name] = float(duration)
+    return timings
+
+
+results = []
+for case in cases:
+    body = dict(case["bounds"], zoom_level=case["zoom"], format=case["format"])
+    client.post('/api/get_air_quality', json=body)
+    totals, runs, points = [], [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.post('/api/get_air_quality', json=body)
+        response.get_data()
+        totals.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        runs.append(stages(response.headers.get('Server-Timing', '')))
+        if case["format"] == 'geojson':
+            points = len(response.get_json()['features'])
+        else:
+            width, height = struct.unpack_from('<II', response.get_data(), 8)
+            points = width * height
+    names = sorted({name for run in runs for name in run})
+    samples = {name: [run.get(name, 0.0) for run in runs] for name in names}
+    results.append(dict(case, points=points, total_ms=float(np.median(totals)), total_mad_ms=mad(totals),
+                        stages_ms={name: float(np.median(values)) for name, values in samples.items()},
+                        stages_mad_ms={name: mad(values) for name, values in samples.items()}))
+print("RESULTS " + json.dumps({"results": results, "inference_backend": app.INFERENCE_BACKEND,
+                               "model_loaded": app.MODEL_LOADED}))
+'''
+
+
+def write_random_weights(path, seed=0):
+    """Save freshly initialized SRCNN weights, the same for the same seed"""
+    import tensorflow as tf
+    from srcnn import build_srcnn_model
+
+    tf.keras.utils.set_random_seed(seed)
+    build_srcnn_model().save(path)
+    return path
+
+
+def bbox(span):
+    half = span / 2
+    return {"lon_min": CENTER_LON - half, "lon_max": CENTER_LON + half,
+            "lat_min": CENTER_LAT - half, "lat_max": CENTER_LAT + half}
+
+
+def run_size(raster_path, weights_path, cases, repeat, workdir):
+    """Results of the cases against one raster, from a fresh interpreter"""
+    env = dict(
+        os.environ,
+        AQI_GEOTIFF_PATH=raster_path,
+        AQI_MODEL_PATH=weights_path,
+        # An empty catalog and no caches, so every request does the full work
+        AQI_CATALOG_DIR=os.path.join(workdir, 'catalog'),
+        AQI_CATALOG_DB=os.path.join(workdir, 'catalog.sqlite'),
+        AQI_TILE_CACHE_DIR=os.path.join(workdir, 'tiles'),
+        AQI_SR_CACHE_MB='0',
+        AQI_RESPONSE_CACHE_MB='0',
+        AQI_SR_PRODUCT='0',
+        AQI_FORECAST_REFRESH_SECONDS='0',
+        # Responses built in memory, so serialization is timed in full
+        AQI_STREAM_MIN_POINTS=str(10 ** 12),
+        AQI_LOG_LEVEL='ERROR'
+    )
+    env.pop('AQI_RASTER_MMAP_DIR', None)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    os.makedirs(env['AQI_CATALOG_DIR'], exist_ok=True)
+    output = subprocess.run([sys.executable, '-c', PROBE, json.dumps(cases), str(repeat)], cwd=BACKEND_DIR,
+                            env=env, capture_output=True, text=True, check=True).stdout
+    line = next(line for line in output.splitlines() if line.startswith('RESULTS '))
+    return json.loads(line[len('RESULTS '):])
+
+
+def case_key(result):
+    return (result['size'], result['zoom'], result['span'], result['format'])
+
+
+def regressions(results, baseline, threshold, min_delta_ms=MIN_DELTA_MS, noise_mads=NOISE_MADS):
+    """Descriptions of every case or stage more than threshold slower than in baseline.
+
+    The slowdown must also be at least min_delta_ms and noise_mads times the
+    larger spread of the two runs' repeats (0 for results without one).
+    """
+    previous = {case_key(result): result for result in baseline['results']}
+    found = []
+    for result in results:
+        before = previous.get(case_key(result))
+        if before is None:
+            continue
+        label = "size {} zoom {} span {} {}".format(*case_key(result))
+        timings = [('total', before['total_ms'], result['total_ms'],
+                    max(before.get('total_mad_ms', 0.0), result.get('total_mad_ms', 0.0)))]
+        timings += [(name, ms, result['stages_ms'].get(name, 0.0),
+                     max(before.get('stages_mad_ms', {}).get(name, 0.0), result.get('stages_mad_ms', {}).get(name, 0.0)))
+                    for name, ms in before['stages_ms'].items()]
+        for name, old, new, spread in timings:
+            floor = max(min_delta_ms, noise_mads * spread)
+            if old >= MIN_STAGE_MS and new > old * (1 + threshold) and new - old >= floor:
+                found.append(f"{label}: {name} {old:.2f} ms -> {new:.2f} ms (+{100 * (new / old - 1):.0f}%)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[600, 2000, 4000], help='Raster edge lengths in pixels')
+    parser.add_argument('--zooms', type=int, nargs='+', default=[9, 10, 11, 12, 13])
+    parser.add_argument('--spans', type=float, nargs='+', default=[0.05, 0.2, 0.5], help='Bbox edge lengths in degrees')
+    parser.add_argument('--formats', nargs='+', default=['geojson', 'grid'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--random-weights', action='store_true', help="Don't use model/srcnn_model.h5 even if present")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results here as JSON (default: stdout)')
+    parser.add_argument('--baseline', help='Earlier --output to check for regressions against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown per case and stage, 0.25 = 25%%')
+    parser.add_argument('--min-delta-ms', type=float, default=MIN_DELTA_MS,
+                        help='Slowdowns smaller than this many milliseconds are never regressions')
+    parser.add_argument('--noise-mads', type=float, default=NOISE_MADS,
+                        help='Slowdowns within this many median absolute deviations of the repeats are never regressions')
+    args = parser.parse_args()
+
+    shipped = os.path.join(BACKEND_DIR, 'model', 'srcnn_model.h5')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if os.path.exists(shipped) and not args.random_weights:
+            weights_path, weights = shipped, 'shipped'
+        else:
+            weights_path, weights = write_random_weights(os.path.join(tmp, 'weights.h5'), args.seed), 'random'
+        for size in args.sizes:
+            raster_path = write_geotiff(os.path.join(tmp, f'bench_{size}.tif'), size, args.seed)
+            cases = [dict(size=size, zoom=zoom, span=span, format=fmt, bounds=bbox(span))
+                     for zoom in args.zooms for span in args.spans for fmt in args.formats]
+            run = run_size(raster_path, weights_path, cases, args.repeat, os.path.join(tmp, str(size)))
+            for result in run['results']:
+                del result['bounds']
+                results.append(result)
+                stages = " ".join(f"{name} {ms:.1f}" for name, ms in result['stages_ms'].items())
+                print(f"size {size:>5} zoom {result['zoom']:>2} span {result['span']:<5} {result['format']:<8} "
+                      f"{result['points']:>8} points {result['total_ms']:>9.1f} ms | {stages}", file=sys.stderr)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "inference_backend": run['inference_backend'],
+            "weights": weights
+        },
+        "repeat": args.repeat,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.threshold, args.min_delta_ms, args.noise_mads)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+        print(f"No regressions over {100 * args.threshold:.0f}% against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
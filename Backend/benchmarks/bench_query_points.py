@@ -0,0 +1,49 @@
+"""Point lookups per second for /api/query_points sampling, nearest vs bilinear.
+
+Samples random lon/lat points over Delhi from a synthetic raster, including
+the WGS 84 to UTM transform. Run from the Backend directory:
+
+    python benchmarks/bench_query_points.py --points 1000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from points import INTERPOLATIONS, sample_points  # noqa: E402
+from raster_store import RasterStore  # noqa: E402
+from fixtures import write_geotiff  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--size', type=int, default=2000, help='Raster edge length in pixels')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = RasterStore(write_geotiff(os.path.join(tmp, 'points.tif'), args.size)).get()
+
+    rng = np.random.default_rng(0)
+    print(f"{'points':>9} " + " ".join(f"{method + ' pts/s':>16}" for method in INTERPOLATIONS))
+    for count in args.points:
+        lons = rng.uniform(76.85, 77.5, count)
+        lats = rng.uniform(28.3, 28.9, count)
+        rates = []
+        for method in INTERPOLATIONS:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                sample_points(snapshot, lons, lats, method)
+                timings.append(time.perf_counter() - start)
+            rates.append(count / np.median(timings))
+        print(f"{count:>9} " + " ".join(f"{rate:>16,.0f}" for rate in rates))
+
+
+if __name__ == '__main__':
+    main()
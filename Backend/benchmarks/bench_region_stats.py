@@ -0,0 +1,67 @@
+"""Region statistics latency: summed-area tables vs a reduction over the window.
+
+Also times polygon queries with the mask rasterized each time vs cached.
+Run from the Backend directory:
+
+    python benchmarks/bench_region_stats.py --boxes 100 500 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import zonal  # noqa: E402
+from raster_store import RasterStore  # noqa: E402
+from fixtures import write_geotiff  # noqa: E402
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--boxes', type=int, nargs='+', default=[100, 500, 2000], help='Box edge lengths in pixels')
+    parser.add_argument('--size', type=int, default=4000, help='Raster edge length in pixels')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = RasterStore(write_geotiff(os.path.join(tmp, 'region.tif'), args.size)).get()
+    data = snapshot.data
+
+    start = time.perf_counter()
+    tables = zonal.region_tables(data)
+    print(f"Region tables for {args.size}x{args.size}: {time.perf_counter() - start:.2f}s, "
+          f"{zonal.table_bytes(data.shape) / 1e6:.0f} MB")
+
+    print(f"{'box':>6} {'SAT ms':>10} {'window ms':>10}")
+    for edge in args.boxes:
+        edge = min(edge, args.size)
+        r0 = c0 = (args.size - edge) // 2
+        sat = median_ms(lambda: zonal.box_stats(*tables, data, r0, r0 + edge, c0, c0 + edge), args.repeat)
+        window = data[r0:r0 + edge, c0:c0 + edge]
+        full = median_ms(lambda: zonal.masked_stats(window, np.ones(window.shape, dtype=bool)), args.repeat)
+        print(f"{edge:>6} {sat:>10.2f} {full:>10.2f}")
+
+    # A rough octagon over central Delhi
+    angles = np.linspace(0, 2 * np.pi, 9)
+    ring = [[77.17 + 0.12 * np.cos(a), 28.6 + 0.1 * np.sin(a)] for a in angles]
+    geometry = {'type': 'Polygon', 'coordinates': [ring]}
+    rasterize = median_ms(lambda: zonal.polygon_mask(geometry, snapshot), args.repeat)
+    (r0, r1, c0, c1), mask = zonal.polygon_mask(geometry, snapshot)
+    cached = median_ms(lambda: zonal.masked_stats(data[r0:r1, c0:c1], mask), args.repeat)
+    print(f"Polygon ({int(mask.sum())} pixels): rasterize {rasterize:.2f} ms, stats with cached mask {cached:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
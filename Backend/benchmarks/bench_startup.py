@@ -0,0 +1,57 @@
+"""Cold-start timings for the Flask backend: import, first liveness answer, readiness.
+
+Each run starts a fresh interpreter, imports app.py and polls /api/test and
+/api/model_status through the Flask test client. Run from the Backend directory:
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PROBE = r'''
+import json, time
+start = time.time()
+import app
+imported = time.time()
+client = app.app.test_client()
+assert client.get('/api/test').status_code == 200
+live = time.time()
+while client.get('/api/model_status').status_code != 200:
+    time.sleep(0.01)
+ready = time.time()
+print("STARTUP " + json.dumps({
+    "import_seconds": imported - start,
+    "live_seconds": live - start,
+    "ready_seconds": ready - start,
+    "model_loaded": app.MODEL_LOADED
+}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout
+        line = next(line for line in output.splitlines() if line.startswith('STARTUP '))
+        results.append(json.loads(line[len('STARTUP '):]))
+
+    for key in ('import_seconds', 'live_seconds', 'ready_seconds'):
+        values = [result[key] for result in results]
+        print(f"{key:>15}: median {np.median(values):.2f}s (min {min(values):.2f}s, max {max(values):.2f}s)")
+    print(f"{'model_loaded':>15}: {results[-1]['model_loaded']}")
+
+
+if __name__ == '__main__':
+    main()
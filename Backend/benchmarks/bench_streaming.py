@@ -0,0 +1,79 @@
+"""Peak memory and time to first byte for GeoJSON responses, built in memory vs streamed.
+
+Serializes a synthetic raster at sample rate 1 the way get_air_quality does,
+once as a full feature list passed through json.dumps and once in row blocks
+with features_json. Run from the Backend directory:
+
+    python benchmarks/bench_streaming.py --sizes 250 500 1000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from features import build_features, features_json, sample_grid, values_to_aqi  # noqa: E402
+
+# Pixel size and origin of the shipped UTM 43N raster, close enough for timing
+ORIGIN_X, ORIGIN_Y, PIXEL_SIZE = 675500.0, 3198240.0, 100.0
+
+
+def georeference(rows, cols):
+    return ORIGIN_X + (cols + 0.5) * PIXEL_SIZE, ORIGIN_Y - (rows + 0.5) * PIXEL_SIZE
+
+
+def in_memory(raster):
+    values, rows, cols = sample_grid(raster, 1)
+    lons, lats = georeference(rows, cols)
+    features = build_features(lons, lats, values_to_aqi(values), {"is_model_data": True})
+    yield json.dumps({"type": "FeatureCollection", "features": features, "metadata": {}})
+
+
+def streamed(raster, chunk_points):
+    block_rows = max(1, chunk_points // raster.shape[1])
+    yield '{"type": "FeatureCollection", "features": ['
+    for block_start in range(0, raster.shape[0], block_rows):
+        values, rows, cols = sample_grid(raster[block_start:block_start + block_rows], 1)
+        lons, lats = georeference(block_start + rows, cols)
+        chunk = features_json(lons, lats, values_to_aqi(values), {"is_model_data": True})
+        yield chunk if block_start == 0 else ',' + chunk
+    yield '], "metadata": {}}'
+
+
+def measure(chunks):
+    """Return (seconds to first chunk, total seconds, peak traced MB, bytes) consuming chunks like a WSGI server"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    total_bytes = 0
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        total_bytes += len(chunk.encode())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first, elapsed, peak / 1e6, total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[250, 500, 1000], help='Raster edge lengths')
+    parser.add_argument('--chunk-points', type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'points':>9} {'mode':>10} {'first byte ms':>14} {'total ms':>9} {'peak MB':>8} {'body MB':>8}")
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        raster = rng.uniform(0, 255, (size, size)).astype(np.float32)
+        for mode, chunks in (('in-memory', in_memory(raster)), ('streamed', streamed(raster, args.chunk_points))):
+            first, elapsed, peak, body = measure(chunks)
+            print(f"{size * size:>9} {mode:>10} {first * 1000:>14.1f} {elapsed * 1000:>9.1f} {peak:>8.1f} {body / 1e6:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""Synthetic NO2 GeoTIFFs for the benchmarks, georeferenced like the Delhi raster (UTM zone 43N)."""
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+# Upper-left corner of the Delhi raster and its extent in metres
+ORIGIN_X, ORIGIN_Y = 675503.85, 3198239.15
+EXTENT = 70000.0
+CRS = 'EPSG:32643'
+
+
+def synthetic_band(size, seed=0):
+    """Smooth 0-255 plume pattern with noise and a NaN patch in the top-left corner"""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.mgrid[0:size, 0:size].astype(np.float32) * (600.0 / size)
+    band = 128 + 100 * np.sin(cols / 37.0) * np.cos(rows / 53.0) + rng.normal(0, 5, (size, size))
+    band = band.astype(np.float32)
+    band[:max(1, size // 100), :max(1, size // 80)] = np.nan
+    return band
+
+
+def write_geotiff(path, size, seed=0):
+    """Write a size x size float32 GeoTIFF covering the Delhi extent and return its path"""
+    pixel_size = EXTENT / size
+    with rasterio.open(path, 'w', driver='GTiff', width=size, height=size, count=1, dtype='float32',
+                       crs=CRS, transform=from_origin(ORIGIN_X, ORIGIN_Y, pixel_size, pixel_size)) as dst:
+        dst.write(synthetic_band(size, seed), 1)
+    return path
@@ -0,0 +1,147 @@
+"""Requests per second and latency percentiles against gunicorn worker count.
+
+For each worker count this starts `gunicorn -c gunicorn.conf.py app:app`,
+waits until every worker reports ready, then has --clients threads post a
+mix of get_air_quality requests (zoom 10-13, random views over Delhi) for
+--duration seconds. Run from the Backend directory:
+
+    python benchmarks/load_test.py --workers 1 2 4 --clients 16 --duration 20
+
+Pass --url to load-test a server that is already running instead.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# (zoom level, view size in degrees); zoom 12+ goes through super-resolution
+REQUEST_MIX = [(10, 0.5), (11, 0.2), (12, 0.1), (13, 0.02)]
+DELHI_CENTER = (77.15, 28.6)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request_body(rng):
+    zoom, size = REQUEST_MIX[rng.integers(len(REQUEST_MIX))]
+    lon = DELHI_CENTER[0] + rng.uniform(-0.1, 0.1)
+    lat = DELHI_CENTER[1] + rng.uniform(-0.1, 0.1)
+    return json.dumps({
+        "lat_min": lat - size / 2, "lat_max": lat + size / 2,
+        "lon_min": lon - size / 2, "lon_max": lon + size / 2,
+        "zoom_level": zoom
+    })
+
+
+def wait_until_ready(url, workers, timeout):
+    """Poll /api/model_status on fresh connections until `workers` distinct processes are ready"""
+    parts = urlsplit(url)
+    ready_pids = set()
+    deadline = time.monotonic() + timeout
+    while len(ready_pids) < workers and time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=5)
+            connection.request('GET', '/api/model_status')
+            response = connection.getresponse()
+            status = json.loads(response.read())
+            connection.close()
+            if response.status == 200:
+                ready_pids.add(status.get('worker_pid'))
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.1)
+    return len(ready_pids)
+
+
+def run_load(url, clients, duration, seed=0):
+    """Return (requests per second, latencies in seconds, error count)"""
+    parts = urlsplit(url)
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+    barrier = threading.Barrier(clients + 1)
+    stop_at = []
+
+    def client(index):
+        rng = np.random.default_rng(seed + index)
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+        barrier.wait()
+        while time.monotonic() < stop_at[0]:
+            body = request_body(rng)
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/api/get_air_quality', body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+                ok = False
+            latencies[index].append(time.perf_counter() - start)
+            errors[index] += not ok
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    stop_at.append(time.monotonic() + duration)
+    start = time.perf_counter()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    all_latencies = np.concatenate([np.asarray(l) for l in latencies])
+    return len(all_latencies) / elapsed, all_latencies, sum(errors)
+
+
+def report(label, rps, latencies, errors):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if len(latencies) else (float('nan'),) * 2
+    print(f"{label:>8} {rps:>8.1f} {p50:>8.1f} {p99:>8.1f} {len(latencies):>9} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4, help='Request threads per worker')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client connections')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of load per worker count')
+    parser.add_argument('--ready-timeout', type=float, default=180)
+    parser.add_argument('--url', help='Load-test this running server instead of starting gunicorn')
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'requests':>9} {'errors':>7}")
+    if args.url:
+        report('-', *run_load(args.url, args.clients, args.duration))
+        return
+
+    for workers in args.workers:
+        port = free_port()
+        env = dict(os.environ, AQI_BIND=f"127.0.0.1:{port}", AQI_WORKERS=str(workers), AQI_THREADS=str(args.threads))
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                                  cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            url = f"http://127.0.0.1:{port}"
+            ready = wait_until_ready(url, workers, args.ready_timeout)
+            if ready < workers:
+                print(f"Warning: only {ready} of {workers} workers reported ready")
+            report(str(workers), *run_load(url, args.clients, args.duration))
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _sizeof(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return len(value)
+
+
+class ByteLRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values in bytes.
+
+    Values are numpy arrays or bytes. With persist_dir set, array values are
+    also written to disk as .npy files and reloaded on a miss, so the cache
+    survives restarts. Disk entries are dropped together with evicted ones,
+    and the directory is held to max_bytes as well: files left from earlier
+    runs (or written by other processes sharing it) are deleted least
+    recently used first, at startup and whenever it grows past the budget.
+    """
+
+    def __init__(self, max_bytes, persist_dir=None):
+        self.max_bytes = max_bytes
+        self.persist_dir = persist_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self._disk_bytes = 0
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+            self._trim_disk()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        value = self._load(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            evicted = self._insert(key, value)
+        self._remove_files(evicted)
+        return value
+
+    def put(self, key, value):
+        if _sizeof(value) > self.max_bytes:
+            return
+        if isinstance(value, np.ndarray):
+            # Cached arrays are shared between requests
+            value.setflags(write=False)
+        with self._lock:
+            evicted = self._insert(key, value)
+        self._remove_files(evicted)
+        self._save(key, value)
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+        self._remove_files(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_hits": self.disk_hits,
+                "disk_bytes": self._disk_bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "persist_dir": self.persist_dir
+            }
+
+    def _insert(self, key, value):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= _sizeof(previous)
+        self._entries[key] = value
+        self._bytes += _sizeof(value)
+
+        evicted = []
+        while self._bytes > self.max_bytes and self._entries:
+            old_key, old_value = self._entries.popitem(last=False)
+            self._bytes -= _sizeof(old_value)
+            self.evictions += 1
+            evicted.append(old_key)
+        return evicted
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.persist_dir, f"{digest}.npy")
+
+    def _load(self, key):
+        if not self.persist_dir:
+            return None
+        path = self._path(key)
+        try:
+            value = np.load(path)
+            # Disk trimming goes by mtime, so mark the file as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        value.setflags(write=False)
+        return value
+
+    def _save(self, key, value):
+        if not self.persist_dir or not isinstance(value, np.ndarray):
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not persist cache entry: %s", e)
+            return
+        with self._lock:
+            self._disk_bytes += value.nbytes
+            over_budget = self._disk_bytes > self.max_bytes
+        if over_budget:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        """Delete the least recently used .npy files until persist_dir fits in max_bytes"""
+        files = []
+        for entry in os.scandir(self.persist_dir):
+            if not entry.name.endswith('.npy'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, entry.path, stat.st_size))
+        files.sort()
+        total = sum(size for _, _, size in files)
+        removed = 0
+        for _, path, size in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            logger.info("Removed %d files from %s to keep it under %d bytes", removed, self.persist_dir, self.max_bytes)
+        with self._lock:
+            self._disk_bytes = total
+
+    def _remove_files(self, keys):
+        if not self.persist_dir:
+            return
+        for key in keys:
+            path = self._path(key)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            with self._lock:
+                self._disk_bytes -= size
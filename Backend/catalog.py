@@ -0,0 +1,262 @@
+"""Catalog of pollutant GeoTIFFs in a directory, indexed by pollutant, timestamp and bounds.
+
+Rasters are named like Delhi_NO2_2023-01-15.tif. Dates may also be written
+20230115, 2023-01 or Jan2023, and POLLUTANT / TIMESTAMP tags in the file take
+precedence over the name. The index is kept in SQLite, so a restart or rescan
+only stats the files and opens the ones that are new or changed.
+"""
+import bisect
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+import rasterio
+from rasterio.warp import transform_bounds
+
+from cog import preferred_path
+from raster_store import RasterStore
+from sr_product import is_product
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLLUTANT = 'NO2'
+
+# lonlat_bounds is (west, south, east, north) in WGS 84
+CatalogEntry = namedtuple('CatalogEntry', ['path', 'pollutant', 'timestamp', 'lonlat_bounds'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rasters (
+    path TEXT PRIMARY KEY,
+    pollutant TEXT,
+    timestamp TEXT,
+    west REAL, south REAL, east REAL, north REAL,
+    width INTEGER,
+    height INTEGER,
+    mtime_ns INTEGER,
+    size INTEGER
+)
+"""
+
+_POLLUTANT_PATTERN = re.compile(r'(?<![a-z0-9])(no2|pm2\.?5|pm10|so2|co|o3|aqi)(?![a-z0-9])', re.IGNORECASE)
+_MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+_DATE_PATTERNS = [
+    (re.compile(r'(?<!\d)(\d{4})-(\d{2})-(\d{2})(?!\d)'), lambda m: (int(m[1]), int(m[2]), int(m[3]))),
+    (re.compile(r'(?<!\d)(\d{4})(\d{2})(\d{2})(?!\d)'), lambda m: (int(m[1]), int(m[2]), int(m[3]))),
+    (re.compile(r'(?<!\d)(\d{4})-(\d{2})(?!\d)'), lambda m: (int(m[1]), int(m[2]), 1)),
+    (re.compile(r'(?<![a-z])(' + '|'.join(_MONTHS) + r')[a-z]*[_-]?(\d{4})(?!\d)', re.IGNORECASE),
+     lambda m: (int(m[2]), _MONTHS.index(m[1].lower()) + 1, 1))
+]
+
+
+def normalize_pollutant(name):
+    """Canonical pollutant name: upper case, PM2.5 written PM25"""
+    return name.upper().replace('.', '') if name else None
+
+
+def parse_date(value):
+    """Parse an ISO date or datetime. A bare date means the end of that day."""
+    parsed = datetime.fromisoformat(value)
+    if len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return parsed
+
+
+def parse_name(filename):
+    """(pollutant, timestamp) from a raster file name, None where not found"""
+    stem = re.sub(r'(\.cog)?\.tiff?$', '', os.path.basename(filename), flags=re.IGNORECASE)
+    match = _POLLUTANT_PATTERN.search(stem)
+    pollutant = normalize_pollutant(match[1]) if match else None
+    for pattern, to_date in _DATE_PATTERNS:
+        match = pattern.search(stem)
+        if match:
+            try:
+                return pollutant, datetime(*to_date(match))
+            except ValueError:
+                continue
+    return pollutant, None
+
+
+class RasterCatalog:
+    """Looks up the raster for a pollutant and time and pools open RasterStores.
+
+    Lookups bisect a per-pollutant list of timestamps. The directory is
+    rescanned at most every rescan_seconds, so new files show up without a
+    restart. At most pool_size RasterStores are kept, least recently used
+    first out; requests holding a snapshot of an evicted store are unaffected.
+    """
+
+    def __init__(self, directory, db_path, pool_size=4, rescan_seconds=60, mmap_dir=None):
+        self.directory = directory
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.rescan_seconds = rescan_seconds
+        self.mmap_dir = mmap_dir
+        self._index = {}
+        self._scanned_at = None
+        self._scan_lock = threading.Lock()
+        self._pool = OrderedDict()
+        self._pool_lock = threading.Lock()
+        self.pool_hits = 0
+        self.pool_misses = 0
+
+    def scan(self):
+        """Index new or changed rasters, drop deleted ones and rebuild the lookup index"""
+        with self._scan_lock:
+            counts = self._scan()
+            self._scanned_at = time.monotonic()
+        logger.info("Raster catalog: %d indexed, %d unchanged, %d removed",
+                    counts['indexed'], counts['unchanged'], counts['removed'])
+        return counts
+
+    def lookup(self, pollutant=None, date=None, lonlat_bounds=None):
+        """Latest raster for pollutant at or before date (or the latest overall), optionally
+        intersecting lonlat_bounds. Returns a CatalogEntry or None."""
+        self._maybe_rescan()
+        series = self._index.get(normalize_pollutant(pollutant) or DEFAULT_POLLUTANT)
+        if not series:
+            return None
+        keys, entries = series
+        i = len(keys) if date is None else bisect.bisect_right(keys, date.isoformat())
+        while i > 0:
+            i -= 1
+            if lonlat_bounds is None or _intersects(entries[i].lonlat_bounds, lonlat_bounds):
+                return entries[i]
+        return None
+
+    def series(self, pollutant):
+        """Every CatalogEntry of a pollutant, oldest first"""
+        self._maybe_rescan()
+        series = self._index.get(normalize_pollutant(pollutant) or DEFAULT_POLLUTANT)
+        return list(series[1]) if series else []
+
+    def pollutants(self):
+        """Pollutants with at least one dated raster"""
+        self._maybe_rescan()
+        return sorted(self._index)
+
+    def store(self, entry):
+        """Pooled RasterStore for a catalog entry"""
+        path = preferred_path(entry.path)
+        with self._pool_lock:
+            store = self._pool.get(path)
+            if store is not None:
+                self._pool.move_to_end(path)
+                self.pool_hits += 1
+                return store
+            self.pool_misses += 1
+            store = RasterStore(path, mmap_dir=self.mmap_dir)
+            self._pool[path] = store
+            while len(self._pool) > self.pool_size:
+                self._pool.popitem(last=False)
+            return store
+
+    def summary(self):
+        """Time range and raster count per pollutant, plus pool counters"""
+        self._maybe_rescan()
+        return {
+            "directory": self.directory,
+            "pollutants": {
+                pollutant: {
+                    "rasters": len(keys),
+                    "first": keys[0],
+                    "last": keys[-1]
+                }
+                for pollutant, (keys, _) in sorted(self._index.items())
+            },
+            "pool": {
+                "open": len(self._pool),
+                "size": self.pool_size,
+                "hits": self.pool_hits,
+                "misses": self.pool_misses
+            }
+        }
+
+    def _maybe_rescan(self):
+        if self._scanned_at is not None and time.monotonic() - self._scanned_at < self.rescan_seconds:
+            return
+        if self._scanned_at is None:
+            self.scan()
+        elif self._scan_lock.acquire(blocking=False):
+            # Only one thread rescans; the others keep using the current index
+            try:
+                self._scan()
+                self._scanned_at = time.monotonic()
+            finally:
+                self._scan_lock.release()
+
+    def _scan(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        counts = {"indexed": 0, "unchanged": 0, "removed": 0}
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with connection:
+                connection.execute(SCHEMA)
+                known = {path: (mtime, size) for path, mtime, size in
+                         connection.execute("SELECT path, mtime_ns, size FROM rasters")}
+                seen = set()
+                for name in sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []:
+                    # COGs are read in place of their source file (see cog.preferred_path)
+                    # and super-resolved products alongside it (see sr_product.py)
+                    if (not name.lower().endswith(('.tif', '.tiff')) or name.lower().endswith('.cog.tif')
+                            or is_product(name)):
+                        continue
+                    path = os.path.join(self.directory, name)
+                    stat = os.stat(path)
+                    seen.add(path)
+                    if known.get(path) == (stat.st_mtime_ns, stat.st_size):
+                        counts["unchanged"] += 1
+                        continue
+                    try:
+                        row = _describe(path)
+                    except Exception as e:
+                        logger.warning("Raster catalog: could not index %s: %s", path, e)
+                        continue
+                    connection.execute(
+                        "INSERT OR REPLACE INTO rasters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (path, *row, stat.st_mtime_ns, stat.st_size)
+                    )
+                    counts["indexed"] += 1
+                for path in set(known) - seen:
+                    connection.execute("DELETE FROM rasters WHERE path = ?", (path,))
+                    counts["removed"] += 1
+
+            rows = connection.execute(
+                "SELECT path, pollutant, timestamp, west, south, east, north FROM rasters "
+                "WHERE pollutant IS NOT NULL AND timestamp IS NOT NULL ORDER BY pollutant, timestamp, path"
+            ).fetchall()
+        finally:
+            connection.close()
+
+        index = {}
+        for path, pollutant, timestamp, *lonlat_bounds in rows:
+            keys, entries = index.setdefault(pollutant, ([], []))
+            keys.append(timestamp)
+            entries.append(CatalogEntry(path, pollutant, datetime.fromisoformat(timestamp), tuple(lonlat_bounds)))
+        self._index = index
+        return counts
+
+
+def _describe(path):
+    """(pollutant, ISO timestamp, west, south, east, north, width, height) of a GeoTIFF"""
+    with rasterio.open(path) as src:
+        tags = src.tags()
+        lonlat_bounds = transform_bounds(src.crs, 'EPSG:4326', *src.bounds) if src.crs else tuple(src.bounds)
+        width, height = src.width, src.height
+
+    pollutant, timestamp = parse_name(path)
+    if tags.get('POLLUTANT'):
+        pollutant = normalize_pollutant(tags['POLLUTANT'])
+    if tags.get('TIMESTAMP'):
+        timestamp = datetime.fromisoformat(tags['TIMESTAMP'])
+    if pollutant is None or timestamp is None:
+        logger.warning("Raster catalog: no pollutant or date for %s, it won't be served by date", path)
+    return (pollutant, timestamp.isoformat() if timestamp else None, *lonlat_bounds, width, height)
+
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
@@ -0,0 +1,102 @@
+"""Convert the NO2 GeoTIFF into a tiled Cloud-Optimized GeoTIFF with internal overviews.
+
+Run from the Backend directory:
+
+    python cog.py data/Delhi_NO2_Jan2023.tif
+
+This writes data/Delhi_NO2_Jan2023.cog.tif next to the original. The server
+reads the COG instead of the original whenever it is at least as new, and
+serves low zoom levels from its overviews.
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.shutil import copy as rio_copy
+
+BLOCK_SIZE = 256
+
+
+def cog_path(path):
+    """Where the COG made from a GeoTIFF lives"""
+    return f"{os.path.splitext(path)[0]}.cog.tif"
+
+
+def preferred_path(path):
+    """The COG made from path if it exists and is at least as new, else path itself"""
+    cog = cog_path(path)
+    if os.path.exists(cog) and (not os.path.exists(path) or os.path.getmtime(cog) >= os.path.getmtime(path)):
+        return cog
+    return path
+
+
+def overview_factors(width, height, block_size=BLOCK_SIZE):
+    """Power-of-two decimation factors until the coarsest overview fits in one block"""
+    factors = []
+    factor = 2
+    while True:
+        factors.append(factor)
+        if math.ceil(max(width, height) / factor) <= block_size:
+            return factors
+        factor *= 2
+
+
+def convert(src_path, dst_path, factors=None, resampling='average', block_size=BLOCK_SIZE):
+    """Write a tiled, deflate-compressed copy of src_path with internal overviews"""
+    with rasterio.open(src_path) as src:
+        profile = src.profile.copy()
+        data = src.read()
+
+    floating = np.issubdtype(data.dtype, np.floating)
+    if profile.get('nodata') is None and floating:
+        # Lets the averaging skip NaN pixels instead of spreading them
+        profile['nodata'] = np.nan
+    creation_options = dict(
+        tiled=True, blockxsize=block_size, blockysize=block_size,
+        compress='deflate', predictor=3 if floating else 2
+    )
+    profile.update(driver='GTiff', interleave='band', **creation_options)
+    factors = factors or overview_factors(profile['width'], profile['height'], block_size)
+
+    # Overviews are built in a scratch file and then copied, so the result has
+    # the COG layout (overviews and IFDs ahead of the full-resolution tiles)
+    scratch_path = f"{dst_path}.{os.getpid()}.scratch.tif"
+    tmp_path = f"{dst_path}.{os.getpid()}.tmp"
+    try:
+        with rasterio.open(scratch_path, 'w', **profile) as dst:
+            dst.write(data)
+            dst.build_overviews(factors, Resampling[resampling])
+            dst.update_tags(ns='rio_overview', resampling=resampling)
+        rio_copy(scratch_path, tmp_path, driver='GTiff', copy_src_overviews=True, **creation_options)
+        # Readers see either the previous file or the finished one
+        os.replace(tmp_path, dst_path)
+    finally:
+        for path in (scratch_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return factors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('src', help='GeoTIFF to convert')
+    parser.add_argument('dst', nargs='?', help='Output path (default: <src>.cog.tif)')
+    parser.add_argument('--overviews', type=int, nargs='+', metavar='FACTOR',
+                        help='Decimation factors (default: powers of two down to one block)')
+    parser.add_argument('--resampling', default='average', choices=['average', 'nearest', 'bilinear', 'mode'])
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE)
+    args = parser.parse_args()
+
+    dst = args.dst or cog_path(args.src)
+    factors = convert(args.src, dst, args.overviews, args.resampling, args.block_size)
+    with rasterio.open(dst) as cog:
+        shapes = [f"{math.ceil(cog.height / f)}x{math.ceil(cog.width / f)}" for f in cog.overviews(1)]
+        print(f"Wrote {dst}: {cog.height}x{cog.width} in {cog.block_shapes[0]} blocks, "
+              f"overviews {factors} ({', '.join(shapes)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Content-Encoding negotiation and compression of response bodies.
+
+get_air_quality bodies are compressed once per ETag and kept in a cache, so
+levels can favour size over speed. Streamed bodies are compressed chunk by
+chunk as they are sent.
+"""
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+
+# Bodies smaller than this aren't worth compressing
+MIN_SIZE = 512
+
+
+def available_encodings():
+    """Content codings this server can produce, most preferred first"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding(accept_encodings):
+    """Best coding the client accepts (a werkzeug Accept-Encoding header), or 'identity'"""
+    for encoding in available_encodings():
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return 'identity'
+
+
+def compress(body, encoding):
+    """body (bytes) in the given content coding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output the same for the same body
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+def compress_chunks(chunks, encoding):
+    """Compress an iterable of bytes as it is consumed, for streamed bodies"""
+    if encoding == 'identity':
+        yield from chunks
+        return
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        # wbits 31 writes a gzip header and trailer around the deflate stream
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+    # Each chunk is flushed so the client can start on it, as with the uncompressed stream
+    for chunk in chunks:
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+
+# Upper AQI bound of each category and its display color. Anything above the
+# last breakpoint is Hazardous.
+AQI_BREAKPOINTS = [50, 100, 150, 200, 300]
+AQI_COLORS = [
+    "#00E400",  # Green - Good
+    "#FFFF00",  # Yellow - Moderate
+    "#FF7E00",  # Orange - Unhealthy for sensitive groups
+    "#FF0000",  # Red - Unhealthy
+    "#99004C",  # Purple - Very unhealthy
+    "#7E0023"   # Maroon - Hazardous
+]
+AQI_CATEGORY_NAMES = [
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous"
+]
+
+
+def get_aqi_color(aqi_value):
+    for breakpoint, color in zip(AQI_BREAKPOINTS, AQI_COLORS):
+        if aqi_value <= breakpoint:
+            return color
+    return AQI_COLORS[-1]
+
+
+def aqi_category(aqi):
+    """Index into AQI_COLORS for each value of an AQI array"""
+    return np.digitize(aqi, AQI_BREAKPOINTS, right=True)
+
+
+def values_to_aqi(values):
+    """Convert raster values (0-255) to integer AQI (0-500), truncating like int()"""
+    scaled = np.trunc(np.asarray(values, dtype=np.float64) * 500 / 255)
+    return np.clip(scaled, 0, 500).astype(np.int64)
+
+
+def sample_grid(raster_data, sample_rate):
+    """Take every sample_rate-th pixel and return (values, rows, cols) of the finite ones.
+
+    Rows and cols are offsets into raster_data, in row-major order.
+    """
+    sampled = raster_data[::sample_rate, ::sample_rate]
+    valid = np.isfinite(sampled)
+    rows, cols = np.nonzero(valid)
+    return sampled[valid], rows * sample_rate, cols * sample_rate
+
+
+def build_features(lons, lats, aqi, properties=None):
+    """Build GeoJSON point features in one pass from coordinate and AQI arrays"""
+    colors = np.asarray(AQI_COLORS)[aqi_category(aqi)].tolist()
+    extra = properties or {}
+    return [
+        {
+            "type": "Feature",
+            "properties": {"aqi": value, "color": color, **extra},
+            "geometry": {
+                "type": "Point",
+                "coordinates": [lon, lat]
+            }
+        }
+        for lon, lat, value, color in zip(
+            np.asarray(lons).tolist(), np.asarray(lats).tolist(), np.asarray(aqi).tolist(), colors
+        )
+    ]
+
+
+def features_json(lons, lats, aqi, properties=None):
+    """Serialize the features build_features would return as comma-separated JSON text.
+
+    Formats straight from the arrays, without building a dict per point.
+    """
+    extra = ''.join(f', {json.dumps(key)}: {json.dumps(value)}' for key, value in (properties or {}).items())
+    template = ('{"type": "Feature", "properties": {"aqi": %d, "color": "%s"' + extra.replace('%', '%%') +
+                '}, "geometry": {"type": "Point", "coordinates": [%r, %r]}}')
+    colors = np.asarray(AQI_COLORS)[aqi_category(aqi)].tolist()
+    return ','.join(
+        template % feature for feature in zip(
+            np.asarray(aqi).tolist(), colors, np.asarray(lons).tolist(), np.asarray(lats).tolist()
+        )
+    )
@@ -0,0 +1,368 @@
+"""Per-pixel pollutant forecasts fitted over the catalog's history of rasters.
+
+Run from the Backend directory (e.g. from cron), or let the server refresh
+them every AQI_FORECAST_REFRESH_SECONDS:
+
+    python forecast.py --pollutant NO2 --horizon 3
+
+The rasters of a pollutant that share the grid of its latest raster are
+stacked into a (time, rows, cols) cube. Every pixel gets a damped-trend Holt
+model and a seasonal-naive model, fitted together as array operations over
+the whole cube, one time step at a time. With the default 'auto' method each
+pixel uses whichever model had the smaller one-step-ahead error on its
+history. The forecast is written to cache/forecast/<pollutant>.forecast.tif,
+one band per step, tagged with a key of the history it was fitted on so
+unchanged histories are not refitted.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import rasterio
+
+import geo
+from catalog import RasterCatalog, normalize_pollutant
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('auto', 'holt', 'seasonal_naive')
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'forecast')
+
+# Fewer rasters than this give no trend or error to fit, only the last one
+# copied forward, so no forecast is written and get_forecast falls back
+MIN_HISTORY = 3
+
+# bands is (horizon, rows, cols); timestamps has one datetime per band
+ForecastSnapshot = namedtuple(
+    'ForecastSnapshot',
+    ['bands', 'timestamps', 'transform', 'inverse_transform', 'method', 'issued', 'mtime']
+)
+
+
+def forecast_path(directory, pollutant):
+    return os.path.join(directory, f"{pollutant}.forecast.tif")
+
+
+def fit_holt(cube, alpha=0.5, beta=0.1, phi=0.9):
+    """(level, trend, mean absolute one-step error) per pixel of a damped-trend Holt model.
+
+    The trend starts from a pixel's first two observations. Missing
+    observations advance the level along the trend without updating it.
+    Pixels without any observation get NaN.
+    """
+    finite = np.isfinite(cube)
+    first = np.argmax(finite, axis=0)
+    level = np.take_along_axis(cube, first[np.newaxis], axis=0)[0].astype(np.float64)
+    trend = np.zeros_like(level)
+    error_sum = np.zeros_like(level)
+    error_count = np.zeros(level.shape, dtype=np.int64)
+
+    initialized = np.zeros(level.shape, dtype=bool)
+    for t in range(1, len(cube)):
+        predicted = level + phi * trend
+        seen = finite[t] & (t > first)
+        # The second observation of a pixel sets its trend, the rest update the model
+        start = seen & ~initialized
+        update = seen & initialized
+        error = np.where(update, cube[t] - predicted, 0.0)
+        new_level = np.where(start, cube[t], predicted + alpha * error)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            first_trend = (cube[t] - level) / (t - first)
+        trend = np.where(start, first_trend,
+                         np.where(update, phi * trend + beta * (new_level - level - phi * trend), phi * trend))
+        level = new_level
+        initialized |= start
+        error_sum += np.abs(error)
+        error_count += update
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mae = np.where(error_count > 0, error_sum / error_count, np.nan)
+    return level, trend, mae
+
+
+def holt_forecast(level, trend, horizon, phi=0.9):
+    """(horizon, rows, cols) forecast of a fitted Holt model"""
+    damping = np.cumsum(phi ** np.arange(1, horizon + 1))
+    return level[np.newaxis] + damping[:, np.newaxis, np.newaxis] * trend[np.newaxis]
+
+
+def seasonal_naive(cube, horizon, period=7):
+    """(forecast, mean absolute error) of repeating the last period of the history.
+
+    Both are NaN where the history is shorter than period or has gaps.
+    """
+    steps, rows, cols = cube.shape
+    if steps < period:
+        nan = np.full((rows, cols), np.nan)
+        return np.full((horizon, rows, cols), np.nan), nan
+    forecast = cube[steps - period + np.arange(horizon) % period].astype(np.float64)
+    errors = np.abs(cube[period:] - cube[:-period])
+    valid = np.isfinite(errors)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mae = np.where(valid, errors, 0).sum(axis=0, dtype=np.float64) / valid.sum(axis=0)
+    return forecast, mae
+
+
+def forecast_cube(cube, horizon=3, method='auto', period=7, alpha=0.5, beta=0.1, phi=0.9):
+    """(horizon, rows, cols) float32 forecast of a (time, rows, cols) history cube"""
+    level, trend, holt_mae = fit_holt(cube, alpha, beta, phi)
+    result = holt_forecast(level, trend, horizon, phi)
+    if method != 'holt':
+        seasonal, seasonal_mae = seasonal_naive(cube, horizon, period)
+        use_seasonal = np.isfinite(seasonal).all(axis=0)
+        if method == 'auto':
+            # Seasonal-naive needs a measured error, and beats a Holt model
+            # with none (a pixel observed only once) or a larger one
+            use_seasonal &= np.isfinite(seasonal_mae) & ~(holt_mae <= seasonal_mae)
+        result = np.where(use_seasonal[np.newaxis], seasonal, result)
+    # Concentrations can't go below zero however steep the trend
+    return np.clip(result, 0, None).astype(np.float32)
+
+
+def history(catalog, pollutant, max_steps=60):
+    """(entries, cube) of the latest max_steps rasters of a pollutant on its latest raster's grid"""
+    entries = catalog.series(pollutant)[-max_steps:]
+    if not entries:
+        return [], None
+    with rasterio.open(entries[-1].path) as src:
+        grid = (src.width, src.height, src.transform, src.crs)
+
+    used, layers = [], []
+    for entry in entries:
+        with rasterio.open(entry.path) as src:
+            if (src.width, src.height, src.transform, src.crs) != grid:
+                logger.warning("Forecast: %s is on a different grid, leaving it out", entry.path)
+                continue
+            band = src.read(1, out_dtype=np.float32)
+            if src.nodata is not None and not np.isnan(src.nodata):
+                band[band == src.nodata] = np.nan
+        used.append(entry)
+        layers.append(band)
+    return used, np.stack(layers)
+
+
+def history_key(entries, **options):
+    """Identifies the history files and fit options a forecast was made from"""
+    digest = hashlib.sha1(repr(sorted(options.items())).encode())
+    for entry in entries:
+        stat = os.stat(entry.path)
+        digest.update(f"{entry.path}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.hexdigest()[:16]
+
+
+def is_fresh(path, key):
+    """Whether the forecast at path was fitted on the history identified by key"""
+    if not os.path.exists(path):
+        return False
+    with rasterio.open(path) as src:
+        return src.tags().get('FORECAST_HISTORY') == key
+
+
+def build(catalog, pollutant, directory=DEFAULT_DIR, horizon=3, method='auto', max_steps=60, period=7,
+          min_history=MIN_HISTORY, force=False):
+    """Fit and write the forecast of one pollutant.
+
+    Returns its path, or None with fewer than min_history rasters on one grid,
+    in which case an older forecast is removed too.
+    """
+    # Two rasters at the very least, to space the forecast steps like the history
+    min_history = max(min_history, 2)
+    entries = catalog.series(pollutant)[-max_steps:]
+    path = forecast_path(directory, pollutant)
+    if len(entries) < min_history:
+        return _too_short(path, pollutant, len(entries), min_history)
+    key = history_key(entries, horizon=horizon, method=method, period=period)
+    if not force and is_fresh(path, key):
+        return path
+
+    started = time.time()
+    entries, cube = history(catalog, pollutant, max_steps)
+    if len(entries) < min_history:
+        return _too_short(path, pollutant, len(entries), min_history)
+    forecast = forecast_cube(cube, horizon, method, period)
+
+    timestamps = [entry.timestamp for entry in entries]
+    step = (timestamps[-1] - timestamps[0]) / (len(timestamps) - 1)
+    with rasterio.open(entries[-1].path) as src:
+        profile = dict(
+            driver='GTiff', dtype='float32', count=horizon, nodata=np.nan,
+            width=src.width, height=src.height, crs=src.crs, transform=src.transform,
+            tiled=True, blockxsize=256, blockysize=256, compress='deflate', predictor=3
+        )
+
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with rasterio.open(tmp_path, 'w', **profile) as dst:
+            dst.write(forecast)
+            for band in range(1, horizon + 1):
+                dst.update_tags(band, TIMESTAMP=(timestamps[-1] + band * step).isoformat())
+            dst.update_tags(
+                FORECAST_POLLUTANT=pollutant,
+                FORECAST_METHOD=method,
+                FORECAST_ISSUED=timestamps[-1].isoformat(),
+                FORECAST_STEPS=len(entries),
+                FORECAST_HISTORY=key
+            )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info("Forecast for %s from %d rasters written to %s in %.1fs",
+                pollutant, len(entries), path, time.time() - started)
+    return path
+
+
+def _too_short(path, pollutant, count, min_history):
+    logger.info("Forecast: %d %s raster(s) on one grid, at least %d needed", count, pollutant, min_history)
+    if os.path.exists(path):
+        os.remove(path)
+    return None
+
+
+def refresh(catalog, directory=DEFAULT_DIR, **options):
+    """Rebuild the forecasts of every pollutant whose history changed.
+
+    Only one process refreshes at a time; the others return straight away.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        if not _try_lock(lock):
+            return []
+        return [build(catalog, pollutant, directory, **options) for pollutant in catalog.pollutants()]
+
+
+def _try_lock(lock):
+    """Lock an open file for this process without waiting. False if another process holds it.
+
+    The lock goes away with the file or the process, so a crash never leaves it behind.
+    """
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def start_refresher(catalog, interval, directory=DEFAULT_DIR, **options):
+    """Refresh forecasts every interval seconds on a daemon thread"""
+    def run():
+        while True:
+            try:
+                refresh(catalog, directory, **options)
+            except Exception as e:
+                logger.exception("Error refreshing forecasts: %s", e)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='forecast-refresh', daemon=True)
+    thread.start()
+    return thread
+
+
+class ForecastStore:
+    """Keeps the bands of a forecast GeoTIFF resident, reloading them when the file changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Current snapshot, or None if there is no forecast file"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.mtime == mtime:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.mtime != mtime:
+                snapshot = self._snapshot = self._load(mtime)
+            return snapshot
+
+    def _load(self, mtime):
+        with rasterio.open(self.path) as src:
+            bands = src.read(out_dtype=np.float32)
+            timestamps = [datetime.fromisoformat(src.tags(band)['TIMESTAMP']) for band in range(1, src.count + 1)]
+            tags = src.tags()
+            transform = src.transform
+        bands.setflags(write=False)
+        return ForecastSnapshot(
+            bands=bands,
+            timestamps=timestamps,
+            transform=transform,
+            inverse_transform=~transform,
+            method=tags.get('FORECAST_METHOD'),
+            issued=datetime.fromisoformat(tags['FORECAST_ISSUED']),
+            mtime=mtime
+        )
+
+
+def window_values(snapshot, lonlat_bounds):
+    """Mean forecast value per step over the pixels a WGS 84 bbox touches, NaN where none are valid.
+
+    A bbox with no extent reads the pixel under that point. Returns None when
+    the bbox misses the forecast grid.
+    """
+    west, south, east, north = lonlat_bounds
+    rows, cols = geo.lonlat_to_pixel([west, east, west, east], [north, north, south, south],
+                                     snapshot.inverse_transform)
+    height, width = snapshot.bands.shape[1:]
+    row_min, row_max = max(int(rows.min()), 0), min(int(rows.max()) + 1, height)
+    col_min, col_max = max(int(cols.min()), 0), min(int(cols.max()) + 1, width)
+    if row_min >= row_max or col_min >= col_max:
+        return None
+    window = snapshot.bands[:, row_min:row_max, col_min:col_max].reshape(len(snapshot.bands), -1)
+    valid = np.isfinite(window)
+    counts = valid.sum(axis=1)
+    sums = np.where(valid, window, 0).sum(axis=1, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def main():
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pollutant', action='append', help='Pollutant to forecast, repeatable (default: all)')
+    parser.add_argument('--catalog-dir', default=os.path.join(backend_dir, 'data'))
+    parser.add_argument('--catalog-db', default=os.path.join(backend_dir, 'cache', 'catalog.sqlite'))
+    parser.add_argument('--output-dir', default=DEFAULT_DIR)
+    parser.add_argument('--horizon', type=int, default=3, help='Steps to forecast')
+    parser.add_argument('--method', default='auto', choices=METHODS)
+    parser.add_argument('--max-steps', type=int, default=60, help='Most recent rasters to fit on')
+    parser.add_argument('--period', type=int, default=7, help='Season length of seasonal-naive, in rasters')
+    parser.add_argument('--min-history', type=int, default=MIN_HISTORY, help='Fewest rasters to forecast from')
+    parser.add_argument('--force', action='store_true', help='Refit even if the history has not changed')
+    args = parser.parse_args()
+
+    catalog = RasterCatalog(args.catalog_dir, args.catalog_db)
+    catalog.scan()
+    for pollutant in args.pollutant or catalog.pollutants():
+        started = time.time()
+        path = build(catalog, normalize_pollutant(pollutant), args.output_dir, args.horizon, args.method,
+                     args.max_steps, args.period, args.min_history, args.force)
+        if path is None:
+            print(f"Fewer than {args.min_history} {pollutant} rasters on one grid in {args.catalog_dir}, no forecast")
+        else:
+            print(f"{pollutant}: {path} in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import io
+import struct
+
+import numpy as np
+
+from tiles import GRID_NODATA
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow output is optional
+    pa = None
+
+# Response formats for get_air_quality, by name and mimetype. GeoJSON is the default.
+FORMATS = {
+    'geojson': 'application/geo+json',
+    'grid': 'application/x-aqi-grid',
+    'columnar': 'application/x-aqi-columnar',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Accept header mimetypes in order of preference, so */* and ties pick GeoJSON
+ACCEPT_MIMETYPES = [
+    ('application/geo+json', 'geojson'),
+    ('application/json', 'geojson'),
+    ('application/x-aqi-grid', 'grid'),
+    ('application/x-aqi-columnar', 'columnar'),
+    ('application/vnd.apache.arrow.stream', 'arrow')
+]
+
+# Regular grid: header then height x width little-endian uint16 AQI, row-major,
+# GRID_NODATA where there is no data. Cell (i, j) is centred on
+# (origin_x + j * step_x, origin_y + i * step_y).
+#   magic b'AQIG', version, nodata value, width, height, origin_x, origin_y, step_x, step_y
+GRID_HEADER = struct.Struct('<4sHHIIdddd')
+
+# Columnar points: header then count float32 lons, count float32 lats, count float32 AQI
+#   magic b'AQIC', version, reserved, count
+COLUMNAR_HEADER = struct.Struct('<4sHHI')
+
+
+def available_formats():
+    return [name for name in FORMATS if name != 'arrow' or pa is not None]
+
+
+def negotiate_format(requested, accept_mimetypes):
+    """Pick a response format from an explicit name or the Accept header.
+
+    Returns None when the client asked for a format we can't produce.
+    """
+    if requested:
+        return requested if requested in available_formats() else None
+    offered = [mimetype for mimetype, name in ACCEPT_MIMETYPES if name in available_formats()]
+    best = accept_mimetypes.best_match(offered, default='application/geo+json')
+    return dict(ACCEPT_MIMETYPES)[best]
+
+
+def aqi_grid(aqi, valid):
+    """uint16 AQI grid with GRID_NODATA wherever valid is False"""
+    grid = np.full(valid.shape, GRID_NODATA, dtype=np.uint16)
+    grid[valid] = aqi
+    return grid
+
+
+def encode_grid(grid, origin, step):
+    height, width = grid.shape
+    header = GRID_HEADER.pack(b'AQIG', 1, GRID_NODATA, width, height,
+                              float(origin[0]), float(origin[1]), float(step[0]), float(step[1]))
+    return header + grid.astype('<u2').tobytes()
+
+
+def encode_columnar(lons, lats, aqi):
+    count = len(aqi)
+    header = COLUMNAR_HEADER.pack(b'AQIC', 1, 0, count)
+    columns = [np.asarray(column, dtype='<f4').tobytes() for column in (lons, lats, aqi)]
+    return header + b''.join(columns)
+
+
+def encode_arrow(lons, lats, aqi):
+    table = pa.table({
+        'lon': pa.array(np.asarray(lons, dtype=np.float32)),
+        'lat': pa.array(np.asarray(lats, dtype=np.float32)),
+        'aqi': pa.array(np.asarray(aqi, dtype=np.float32))
+    })
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+# Point queries (/api/query_points): a request body of little-endian float32
+# (lon, lat) pairs, answered with one uint16 AQI per point, GRID_NODATA where
+# there is no data
+POINTS_MIMETYPE = 'application/x-aqi-points'
+POINT_VALUES_MIMETYPE = 'application/x-aqi-values'
+
+
+def decode_points(body):
+    """(lons, lats) float64 arrays from float32 (lon, lat) pairs"""
+    if len(body) % 8:
+        raise ValueError("Point data must be little-endian float32 (lon, lat) pairs")
+    pairs = np.frombuffer(body, dtype='<f4').reshape(-1, 2)
+    return pairs[:, 0].astype(np.float64), pairs[:, 1].astype(np.float64)
+
+
+def encode_point_values(aqi, valid):
+    values = np.full(valid.shape, GRID_NODATA, dtype='<u2')
+    values[valid] = aqi[valid]
+    return values.tobytes()
@@ -0,0 +1,48 @@
+import numpy as np
+from pyproj import Transformer
+
+# The AQI rasters are in UTM zone 43N
+RASTER_CRS = "EPSG:32643"
+
+# Initialize the transformer for WGS 84 to UTM zone 43N
+transformer = Transformer.from_crs("EPSG:4326", RASTER_CRS, always_xy=True)
+
+
+def lonlat_to_xy(lons, lats):
+    """Project arrays of WGS 84 lon/lat to raster CRS x/y in one pyproj call"""
+    return transformer.transform(
+        np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64)
+    )
+
+
+def xy_to_fractional_pixel(xs, ys, inverse_transform):
+    """Raster CRS x/y to float (rows, cols); pixel (r, c) covers [r, r + 1) x [c, c + 1).
+
+    inverse_transform is ~transform, computed once per raster.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    inv = inverse_transform
+    cols = inv.a * xs + inv.b * ys + inv.c
+    rows = inv.d * xs + inv.e * ys + inv.f
+    return rows, cols
+
+
+def xy_to_pixel(xs, ys, inverse_transform):
+    """Raster CRS x/y to integer (rows, cols), flooring like rasterio.transform.rowcol"""
+    rows, cols = xy_to_fractional_pixel(xs, ys, inverse_transform)
+    return np.floor(rows).astype(np.int64), np.floor(cols).astype(np.int64)
+
+
+def lonlat_to_pixel(lons, lats, inverse_transform):
+    """WGS 84 lon/lat arrays straight to integer (rows, cols)"""
+    xs, ys = lonlat_to_xy(lons, lats)
+    return xy_to_pixel(xs, ys, inverse_transform)
+
+
+def pixel_to_xy(rows, cols, transform):
+    """Pixel centre coordinates in the raster CRS, same as rasterio.transform.xy"""
+    cols = np.asarray(cols, dtype=np.float64) + 0.5
+    rows = np.asarray(rows, dtype=np.float64) + 0.5
+    return (transform.a * cols + transform.b * rows + transform.c,
+            transform.d * cols + transform.e * rows + transform.f)
@@ -0,0 +1,54 @@
+"""Production serving: pre-fork gunicorn workers, each with a pool of request threads.
+
+Run from the Backend directory:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Every worker imports app.py itself (no preload), so TensorFlow and the warm-up
+thread are set up after the fork rather than inherited half-initialised from
+the master. The raster is shared instead: workers memory-map the same .npy
+sidecar, so its pages are held once in the OS page cache. SRCNN inference runs
+on each worker's InferenceScheduler thread, so request threads doing raster
+reads and serialization are not blocked behind the model.
+"""
+import glob
+import multiprocessing
+import os
+
+bind = os.environ.get('AQI_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('AQI_WORKERS', min(4, multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.environ.get('AQI_THREADS', 4))
+preload_app = False
+
+# SRCNN warm-up takes a few seconds per worker; readiness is /api/model_status
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# All workers map one copy of the band (see RasterStore)
+os.environ.setdefault('AQI_RASTER_MMAP_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'raster'))
+# Split the cores between workers so their TensorFlow thread pools don't oversubscribe them
+os.environ.setdefault('AQI_TF_THREADS', str(max(1, multiprocessing.cpu_count() // workers)))
+
+# Workers write their metrics here so /metrics adds up all of them (see metrics.py).
+# Must be set before the workers import prometheus_client.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'prometheus'))
+
+
+def on_starting(server):
+    # Counts left over from a previous run would be added to this one's
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+accesslog = os.environ.get('AQI_ACCESS_LOG')
+errorlog = '-'
+
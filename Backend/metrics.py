@@ -0,0 +1,68 @@
+"""Prometheus metrics: request latency per endpoint and time per stage of get_air_quality.
+
+Each worker process keeps its own metrics. When PROMETHEUS_MULTIPROC_DIR is
+set (gunicorn.conf.py sets it), workers write them to files there and
+/metrics adds up all workers.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Stages of get_air_quality: open the raster, transform the bounds to pixels,
+# read the window, normalize for and predict with SRCNN, resample it when
+# asked to interpolate, build features, serialize and compress the response
+STAGES = ('open', 'transform', 'window', 'normalize', 'predict', 'interpolate', 'features', 'serialize', 'compress')
+
+# 0.5 ms to 10 s
+BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+STAGE_SECONDS = Histogram(
+    'aqi_stage_seconds', 'Time spent in each stage of an air quality request',
+    ['stage'], buckets=BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    'aqi_request_seconds', 'Request latency by endpoint and status code',
+    ['endpoint', 'status'], buckets=BUCKETS
+)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def observe(name, seconds):
+    """Record seconds spent in a stage, also in the current request's stage_timings"""
+    STAGE_SECONDS.labels(name).observe(seconds)
+    if has_request_context():
+        timings = g.setdefault('stage_timings', {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def stage_timings():
+    """Seconds per stage spent so far in the current request"""
+    return g.get('stage_timings', {})
+
+
+def server_timing(timings):
+    """Server-Timing header value for stage timings, in milliseconds"""
+    return ', '.join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
+
+
+def render():
+    """(body, content type) of the Prometheus text exposition"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
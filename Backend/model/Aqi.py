@@ -1,145 +1,181 @@
+"""Train the SRCNN super-resolution model on NO2 GeoTIFFs.
+
+Runs headless. Run from the Backend directory:
+
+    python model/Aqi.py --rasters data/ --epochs 50 --batch-size 16
+
+Training pairs come from dataset.make_dataset. Every epoch logs samples per
+second and how the time split between waiting for data and running the
+model. The trained weights are written where app.py loads them
+(model/srcnn_model.h5 by default).
+"""
+import argparse
 import os
-import rasterio
-import matplotlib.pyplot as plt
+import sys
+import time
+
 import numpy as np
-import cv2
-from PIL import Image
-from sklearn.model_selection import train_test_split
 import tensorflow as tf
-from tensorflow.keras import layers, models
-
-# Install required packages (if not already installed)
-# Uncomment the following line if you need to install the packages
-# os.system("pip install rasterio opencv-python-headless pillow matplotlib tensorflow")
-
-# File path to the GeoTIFF file
-file_path = r"C:/Users/yashb/OneDrive/Desktop/Coding/aqi/backend/data/Delhi_NO2_Jan2023.tif"
-
-# Visualize the GeoTIFF file
-with rasterio.open(file_path) as src:
-    image = src.read(1)
-
-plt.imshow(image, cmap='viridis')
-plt.title("AQI Image - NO2 Levels")
-plt.axis("off")
-plt.colorbar(label="NO₂ Concentration")
-plt.show()
-
-# Function to create patches from the image
-def create_patches(img, size=64, stride=64, save_dir="dataset"):
-    os.makedirs(save_dir, exist_ok=True)
-    count = 0
-    for i in range(0, img.shape[0] - size + 1, stride):
-        for j in range(0, img.shape[1] - size + 1, stride):
-            patch = img[i:i+size, j:j+size]
-            patch_img = Image.fromarray(patch.astype(np.uint8))
-            patch_img.save(f"{save_dir}/patch_{count}.png")
-            count += 1
-    print(f"✅ Saved {count} patches in '{save_dir}'")
-
-# Create patches from the image
-create_patches(image)
-
-# Function to save tiles from GeoTIFF
-def save_tiles_from_geotiff(file_path, output_folder="dataset", tile_size=64):
-    os.makedirs(output_folder, exist_ok=True)
-
-    with rasterio.open(file_path) as src:
-        image = src.read(1)  # Read first band
-
-    height, width = image.shape
-    count = 0
-    for i in range(0, height, tile_size):
-        for j in range(0, width, tile_size):
-            tile = image[i:i+tile_size, j:j+tile_size]
-            if tile.shape == (tile_size, tile_size):
-                tile = (255 * (tile - tile.min()) / (tile.max() - tile.min())).astype(np.uint8)
-                img = Image.fromarray(tile)
-                img.save(f"{output_folder}/tile_{count}.png")
-                count += 1
-
-    print(f"✅ All {count} tiles saved in '{output_folder}' folder.")
-
-# Save tiles from the GeoTIFF file
-save_tiles_from_geotiff(file_path)
-
-# Function to load tile pairs for training
-def load_tile_pairs(folder="dataset", scale=2):
-    X, y = [], []
-    for file in os.listdir(folder):
-        if file.endswith(".png"):
-            img = Image.open(os.path.join(folder, file)).convert("L")
-            img = np.array(img)
-
-            # Downscale + Upscale to simulate low-res input
-            low_res = Image.fromarray(img).resize(
-                (img.shape[1] // scale, img.shape[0] // scale), Image.BICUBIC)
-            low_res = low_res.resize(img.shape[::-1], Image.BICUBIC)
-
-            X.append(np.array(low_res) / 255.0)
-            y.append(img / 255.0)
-
-    if len(X) == 0:
-        raise ValueError("No image tiles found in the dataset folder.")
-
-    X = np.array(X).reshape(-1, img.shape[0], img.shape[1], 1)
-    y = np.array(y).reshape(-1, img.shape[0], img.shape[1], 1)
-
-    return train_test_split(X, y, test_size=0.2)
-
-# Load data
-X_train, X_val, y_train, y_val = load_tile_pairs()
-print(f"✅ Training samples: {len(X_train)}, Validation samples: {len(X_val)}")
-
-# Function to build the SRCNN model
-def build_srcnn_model():
-    model = models.Sequential([
-        layers.Conv2D(64, (9, 9), activation='relu', padding='same', input_shape=(None, None, 1)),
-        layers.Conv2D(32, (1, 1), activation='relu', padding='same'),
-        layers.Conv2D(1, (5, 5), activation='linear', padding='same')
-    ])
-    model.compile(optimizer='adam', loss='mse', metrics=['mae'])
-    return model
-
-# Build the SRCNN model
-model = build_srcnn_model()
-model.summary()
-
-# Train the model
-history = model.fit(
-    X_train, y_train,
-    validation_data=(X_val, y_val),
-    epochs=50,
-    batch_size=2
-)
-
-# Function to visualize predictions
-def visualize_predictions(model, X, y, num_samples=3):
-    preds = model.predict(X[:num_samples])
-
-    for i in range(num_samples):
-        plt.figure(figsize=(12, 4))
-
-        # Low-res input
-        plt.subplot(1, 3, 1)
-        plt.imshow(X[i].squeeze(), cmap='gray')
-        plt.title("Low-Res Input")
-        plt.axis('off')
-
-        # Super-res output
-        plt.subplot(1, 3, 2)
-        plt.imshow(preds[i].squeeze(), cmap='gray')
-        plt.title("SRCNN Output")
-        plt.axis('off')
-
-        # High-res ground truth
-        plt.subplot(1, 3, 3)
-        plt.imshow(y[i].squeeze(), cmap='gray')
-        plt.title("High-Res Ground Truth")
-        plt.axis('off')
-
-        plt.tight_layout()
-        plt.show()
-
-# Visualize some predictions
-visualize_predictions(model, X_val, y_val)
\ No newline at end of file
+
+from dataset import make_dataset
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from srcnn import build_srcnn_model, weights_hash  # noqa: E402
+from sr_product import is_product  # noqa: E402
+
+
+def raster_paths(paths):
+    """GeoTIFFs named on the command line, with directories expanded to the rasters in them"""
+    rasters = []
+    for path in paths:
+        if os.path.isdir(path):
+            rasters.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(('.tif', '.tiff')) and not name.lower().endswith('.cog.tif')
+                and not is_product(name)
+            )
+        else:
+            rasters.append(path)
+    return rasters
+
+
+def train(model, train_ds, val_ds, epochs):
+    """Fit model one batch at a time, timing the wait for each batch separately from the step"""
+    history = []
+    for epoch in range(1, epochs + 1):
+        samples = 0
+        data_wait = compute = 0.0
+        losses = []
+        iterator = iter(train_ds)
+        started = time.perf_counter()
+        while True:
+            before_next = time.perf_counter()
+            try:
+                low_res, high_res = next(iterator)
+            except StopIteration:
+                break
+            before_step = time.perf_counter()
+            losses.append(model.train_on_batch(low_res, high_res, return_dict=True))
+            after_step = time.perf_counter()
+            data_wait += before_step - before_next
+            compute += after_step - before_step
+            samples += int(low_res.shape[0])
+        elapsed = time.perf_counter() - started
+
+        logs = {name: float(np.mean([loss[name] for loss in losses])) for name in losses[0]} if losses else {}
+        if val_ds is not None:
+            logs.update({f"val_{name}": float(value)
+                         for name, value in model.evaluate(val_ds, verbose=0, return_dict=True).items()})
+        logs.update(samples_per_second=samples / elapsed if elapsed else 0.0, data_wait=data_wait, compute=compute)
+        history.append(logs)
+
+        metrics = " ".join(f"{name} {value:.5f}" for name, value in logs.items()
+                           if name not in ('samples_per_second', 'data_wait', 'compute'))
+        print(f"Epoch {epoch}/{epochs}: {metrics} | {samples} samples in {elapsed:.1f}s "
+              f"({logs['samples_per_second']:.1f}/s), data wait {data_wait:.1f}s, compute {compute:.1f}s")
+    return history
+
+
+def export_weights(model, path):
+    """Write the weights as a float32 model in the legacy .h5 format app.load_model reads"""
+    export = build_srcnn_model()
+    export.set_weights([np.asarray(w, dtype=np.float32) for w in model.get_weights()])
+    tmp_path = f"{path}.{os.getpid()}.tmp.h5"
+    export.save(tmp_path)
+    # Check the file loads the way the server loads it before replacing anything
+    build_srcnn_model().load_weights(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_preview(model, dataset, path, num_samples=3):
+    """Low-res input, SRCNN output and ground truth for a few tiles, as a PNG"""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, skipping the preview")
+        return
+
+    low_res, high_res = next(iter(dataset.unbatch().batch(num_samples)))
+    preds = model.predict(low_res, verbose=0)
+    fig, axes = plt.subplots(len(preds), 3, figsize=(12, 4 * len(preds)), squeeze=False)
+    for row, images in enumerate(zip(low_res.numpy(), preds, high_res.numpy())):
+        for ax, image, title in zip(axes[row], images, ("Low-Res Input", "SRCNN Output", "High-Res Ground Truth")):
+            ax.imshow(image.squeeze(), cmap='gray')
+            ax.set_title(title)
+            ax.axis('off')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    print(f"Saved preview to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rasters', nargs='+', default=[os.path.join(BACKEND_DIR, 'data', 'Delhi_NO2_Jan2023.tif')],
+                        help='GeoTIFFs or directories of GeoTIFFs to train on')
+    parser.add_argument('--output', default=os.path.join(BACKEND_DIR, 'model', 'srcnn_model.h5'),
+                        help='Where to write the trained weights (default: the file app.py loads)')
+    parser.add_argument('--init-weights', help='Start from these weights instead of random ones')
+    parser.add_argument('--scale', type=int, default=2, help='Downsampling factor of the simulated low-res input')
+    parser.add_argument('--tile-size', type=int, default=64)
+    parser.add_argument('--stride', type=int, help='Tile stride in pixels (default: tile size)')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    parser.add_argument('--val-every', type=int, default=5, help='Every Nth tile is held out for validation, 0 = none')
+    parser.add_argument('--shuffle-buffer', type=int, default=1024)
+    parser.add_argument('--cache', help="Cache normalized tiles: 'memory' or a file prefix (default: no cache)")
+    parser.add_argument('--mixed-precision', action='store_true', help='Compute in float16 (weights stay float32). GPU only: slower than float32 on CPU, so ignored there')
+    parser.add_argument('--intra-op-threads', type=int, default=0, help='TensorFlow intra-op threads, 0 = all cores')
+    parser.add_argument('--inter-op-threads', type=int, default=0, help='TensorFlow inter-op threads, 0 = all cores')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--preview', help='Save a PNG of predictions on validation tiles here')
+    args = parser.parse_args()
+
+    tf.config.threading.set_intra_op_parallelism_threads(args.intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(args.inter_op_threads)
+    if args.seed is not None:
+        tf.keras.utils.set_random_seed(args.seed)
+
+    rasters = raster_paths(args.rasters)
+    if not rasters:
+        parser.error("No GeoTIFFs found in --rasters")
+    print(f"Training on {len(rasters)} raster(s), {args.tile_size}px tiles, scale {args.scale}")
+
+    cache = '' if args.cache == 'memory' else args.cache
+    dataset_args = dict(tile_size=args.tile_size, stride=args.stride, scale=args.scale,
+                        batch_size=args.batch_size, val_every=args.val_every)
+    train_ds = make_dataset(rasters, split='train', shuffle_buffer=args.shuffle_buffer,
+                            cache=cache, seed=args.seed, **dataset_args)
+    val_ds = make_dataset(rasters, split='val', cache=f"{cache}.val" if cache else cache,
+                          **dataset_args) if args.val_every else None
+
+    if args.mixed_precision and not tf.config.list_physical_devices('GPU'):
+        # CPUs emulate most float16 ops, which makes training slower than in float32
+        print("Warning: --mixed-precision needs a GPU and none is visible, training in float32", file=sys.stderr)
+    elif args.mixed_precision:
+        tf.keras.mixed_precision.set_global_policy('mixed_float16')
+    model = build_srcnn_model()
+    if args.init_weights:
+        model.load_weights(args.init_weights)
+    model.compile(optimizer=tf.keras.optimizers.Adam(args.learning_rate), loss='mse', metrics=['mae'])
+    tf.keras.mixed_precision.set_global_policy('float32')
+
+    history = train(model, train_ds, val_ds, args.epochs)
+    if history:
+        total_wait = sum(epoch['data_wait'] for epoch in history)
+        total_compute = sum(epoch['compute'] for epoch in history)
+        print(f"Data wait {100 * total_wait / max(total_wait + total_compute, 1e-9):.0f}% of training time")
+
+    export_weights(model, args.output)
+    print(f"Saved weights to {args.output} (hash {weights_hash(args.output)})")
+
+    if args.preview:
+        save_preview(model, val_ds if val_ds is not None else train_ds, args.preview)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""tf.data pipeline of SRCNN training pairs sliced straight from GeoTIFFs.
+
+Tiles are read from the rasters in strips of tile_size rows, so only one
+strip per raster being read is in memory, whatever the number of rasters.
+Each tile is min-max normalized to 0-1 in float32 and the low-resolution input is made on the fly by bicubic
+down- and up-sampling a whole batch at once.
+"""
+import numpy as np
+import rasterio
+import tensorflow as tf
+from rasterio.windows import Window
+
+
+def raster_tiles(path, tile_size=64, stride=64, split='train', val_every=5):
+    """Full tiles of band 1 with at least one valid pixel, as float32 (tile_size, tile_size, 1).
+
+    Every val_every-th tile (in reading order) goes to the 'val' split and
+    the rest to 'train', so the split is the same on every run.
+    """
+    if isinstance(path, bytes):
+        path = path.decode()
+    if isinstance(split, bytes):
+        split = split.decode()
+    with rasterio.open(path) as src:
+        height, width = src.height, src.width
+    index = 0
+    for row in range(0, height - tile_size + 1, stride):
+        # tf.data resumes the generator on any of its threads and rasterio's
+        # GDAL environment is per thread, so the file isn't kept open across yields
+        with rasterio.open(path) as src:
+            strip = src.read(1, window=Window(0, row, width, tile_size), out_dtype=np.float32)
+            if src.nodata is not None and not np.isnan(src.nodata):
+                strip[strip == src.nodata] = np.nan
+        for col in range(0, width - tile_size + 1, stride):
+            tile = strip[:, col:col + tile_size]
+            if not np.isfinite(tile).any():
+                continue
+            is_val = val_every > 0 and index % val_every == 0
+            index += 1
+            if is_val == (split == 'val'):
+                yield tile[..., np.newaxis]
+
+
+def normalize_tiles(tiles):
+    """Min-max normalize each tile of a (n, h, w, 1) batch to 0-1, no-data becomes 0"""
+    finite = tf.math.is_finite(tiles)
+    low = tf.reduce_min(tf.where(finite, tiles, np.inf), axis=[1, 2, 3], keepdims=True)
+    high = tf.reduce_max(tf.where(finite, tiles, -np.inf), axis=[1, 2, 3], keepdims=True)
+    span = high - low
+    normalized = tf.math.divide_no_nan(tiles - low, span)
+    return tf.where(finite, normalized, tf.zeros_like(normalized))
+
+
+def degrade(tiles, scale=2):
+    """Bicubic down- then up-sample a (n, h, w, 1) batch, simulating a coarser raster"""
+    size = tf.shape(tiles)[1:3]
+    low_res = tf.image.resize(tiles, size // scale, method='bicubic', antialias=True)
+    return tf.image.resize(low_res, size, method='bicubic')
+
+
+def make_dataset(paths, tile_size=64, stride=None, scale=2, batch_size=16, split='train', val_every=5,
+                 shuffle_buffer=1024, cache=None, seed=None):
+    """Batched (low_res, high_res) float32 pairs from the tiles of several rasters.
+
+    cache is None for no caching, '' to cache normalized tiles in memory or
+    a file prefix to cache them on disk, for rasters too big for RAM. Only
+    the 'train' split is shuffled.
+    """
+    stride = stride or tile_size
+    signature = tf.TensorSpec((tile_size, tile_size, 1), tf.float32)
+    files = tf.data.Dataset.from_tensor_slices([str(path) for path in paths])
+    tiles = files.interleave(
+        lambda path: tf.data.Dataset.from_generator(
+            raster_tiles, output_signature=signature,
+            args=(path, tile_size, stride, split, val_every)
+        ),
+        cycle_length=min(len(paths), 4) or 1,
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=split != 'train'
+    )
+    # Normalizing in batches keeps the per-element overhead down
+    tiles = tiles.batch(256).map(normalize_tiles, num_parallel_calls=tf.data.AUTOTUNE).unbatch()
+    if cache is not None:
+        tiles = tiles.cache(cache)
+    if split == 'train' and shuffle_buffer:
+        tiles = tiles.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+
+    pairs = tiles.batch(batch_size).map(
+        lambda high_res: (degrade(high_res, scale), high_res),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+    return pairs.prefetch(tf.data.AUTOTUNE)
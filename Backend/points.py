@@ -0,0 +1,158 @@
+import numpy as np
+
+import geo
+
+INTERPOLATIONS = ('nearest', 'bilinear', 'bicubic', 'idw')
+
+# Inverse distance weighting power, over the 4x4 pixels around each point
+IDW_POWER = 2
+
+
+def sample_points(snapshot, lons, lats, interpolation='nearest'):
+    """Raster values at WGS 84 points as float64, NaN outside the raster or where there is no data"""
+    xs, ys = geo.lonlat_to_xy(lons, lats)
+    rows, cols = geo.xy_to_fractional_pixel(xs, ys, snapshot.inverse_transform)
+    return sample_pixels(snapshot.data, rows, cols, interpolation)
+
+
+def sample_pixels(data, rows, cols, interpolation='nearest'):
+    """Values of data at fractional pixel coordinates (pixel edges at integers)"""
+    if interpolation == 'bilinear':
+        return _bilinear(data, rows, cols)
+    if interpolation == 'bicubic':
+        return _bicubic(data, rows, cols)
+    if interpolation == 'idw':
+        return _idw(data, rows, cols)
+    return _nearest(data, rows, cols)
+
+
+def resample_grid(data, shape, interpolation='bilinear'):
+    """Resample a 2-D array onto a (height, width) grid of equal cells covering it.
+
+    Cell (i, j) is sampled at its centre, ((i + 0.5) * data rows / height,
+    (j + 0.5) * data cols / width) in pixel coordinates of data.
+    """
+    height, width = shape
+    rows = (np.arange(height) + 0.5) * (data.shape[0] / height)
+    cols = (np.arange(width) + 0.5) * (data.shape[1] / width)
+    grid_rows, grid_cols = np.meshgrid(rows, cols, indexing='ij')
+    return sample_pixels(data, grid_rows.ravel(), grid_cols.ravel(), interpolation).reshape(shape)
+
+
+def _nearest(data, rows, cols):
+    height, width = data.shape
+    # NaN coordinates compare False, so they count as outside
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    values = np.full(rows.shape, np.nan)
+    values[inside] = data[rows[inside].astype(np.intp), cols[inside].astype(np.intp)]
+    return values
+
+
+def _bilinear(data, rows, cols):
+    """Interpolate between the four surrounding pixel centres.
+
+    Neighbours without data are left out and the remaining weights
+    renormalized. Within half a pixel of the edge the edge pixels are used.
+    """
+    height, width = data.shape
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    values = np.full(rows.shape, np.nan)
+
+    # Offsets from the pixel centre up and left of each point
+    r = rows[inside] - 0.5
+    c = cols[inside] - 0.5
+    r0 = np.floor(r)
+    c0 = np.floor(c)
+    fr = r - r0
+    fc = c - c0
+    r0 = r0.astype(np.intp)
+    c0 = c0.astype(np.intp)
+    r1 = np.minimum(r0 + 1, height - 1)
+    c1 = np.minimum(c0 + 1, width - 1)
+    r0 = np.maximum(r0, 0)
+    c0 = np.maximum(c0, 0)
+
+    total = np.zeros(r.shape)
+    weight = np.zeros(r.shape)
+    for rr, cc, w in ((r0, c0, (1 - fr) * (1 - fc)), (r0, c1, (1 - fr) * fc),
+                      (r1, c0, fr * (1 - fc)), (r1, c1, fr * fc)):
+        neighbour = data[rr, cc].astype(np.float64)
+        finite = np.isfinite(neighbour)
+        total += np.where(finite, neighbour, 0.0) * w
+        weight += np.where(finite, w, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values[inside] = np.where(weight > 0, total / weight, np.nan)
+    return values
+
+
+def _cubic(distance):
+    """Keys cubic convolution kernel (a = -0.5), as used for bicubic resampling"""
+    x = np.abs(distance)
+    return np.where(x <= 1, (1.5 * x - 2.5) * x * x + 1,
+                    np.where(x < 2, ((-0.5 * x + 2.5) * x - 4) * x + 2, 0.0))
+
+
+def _bicubic(data, rows, cols):
+    """Cubic convolution over the 4x4 surrounding pixels.
+
+    Pixels without data are left out and the weights renormalized; past the
+    edge the edge pixels are repeated. Where too little of the kernel is left,
+    falls back to bilinear.
+    """
+    inside = (rows >= 0) & (rows < data.shape[0]) & (cols >= 0) & (cols < data.shape[1])
+    values = np.full(rows.shape, np.nan)
+    total, weight = _weighted_4x4(data, rows[inside], cols[inside], lambda dy, dx: _cubic(dy) * _cubic(dx),
+                                  repeat_edges=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = np.where(weight > 0.5, total / weight, np.nan)
+    sparse = weight <= 0.5
+    if sparse.any():
+        result[sparse] = _bilinear(data, rows[inside][sparse], cols[inside][sparse])
+    values[inside] = result
+    return values
+
+
+def _idw(data, rows, cols):
+    """Inverse distance weighted mean of the 4x4 surrounding pixel centres"""
+    inside = (rows >= 0) & (rows < data.shape[0]) & (cols >= 0) & (cols < data.shape[1])
+    values = np.full(rows.shape, np.nan)
+    total, weight = _weighted_4x4(
+        data, rows[inside], cols[inside],
+        lambda dy, dx: np.maximum(dy * dy + dx * dx, 1e-12) ** (-IDW_POWER / 2)
+    )
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values[inside] = np.where(weight > 0, total / weight, np.nan)
+    return values
+
+
+def _weighted_4x4(data, rows, cols, weight_of, repeat_edges=False):
+    """(weighted sum, sum of weights) over the 4x4 pixels around each point.
+
+    weight_of(dy, dx) gets each pixel centre's offset from the point. Pixels
+    without data get no weight, and neither do pixels outside the raster
+    unless repeat_edges, which stands the nearest edge pixel in for them.
+    """
+    height, width = data.shape
+    # Offsets from the pixel centre up and left of each point
+    r = rows - 0.5
+    c = cols - 0.5
+    r0 = np.floor(r).astype(np.intp)
+    c0 = np.floor(c).astype(np.intp)
+
+    total = np.zeros(r.shape)
+    weight = np.zeros(r.shape)
+    for i in range(-1, 3):
+        rr = r0 + i
+        row_ok = repeat_edges | ((rr >= 0) & (rr < height))
+        dy = rr - r
+        rr = np.clip(rr, 0, height - 1)
+        for j in range(-1, 3):
+            cc = c0 + j
+            dx = cc - c
+            neighbour = data[rr, np.clip(cc, 0, width - 1)].astype(np.float64)
+            usable = row_ok & (repeat_edges | ((cc >= 0) & (cc < width))) & np.isfinite(neighbour)
+            w = np.where(usable, weight_of(dy, dx), 0.0)
+            total += np.where(usable, neighbour, 0.0) * w
+            weight += w
+    return total, weight
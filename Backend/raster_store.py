@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+import rasterio
+
+logger = logging.getLogger(__name__)
+
+# A consistent view of the raster at one point in time. Request threads keep
+# hold of the snapshot they started with, so a reload mid-request is harmless.
+# overviews maps each decimation factor of the file's internal overviews (see
+# cog.py) to that level's band; it is empty for plain GeoTIFFs. tags are the
+# file's dataset-level metadata tags.
+RasterSnapshot = namedtuple(
+    'RasterSnapshot',
+    ['data', 'transform', 'inverse_transform', 'bounds', 'crs', 'nodata', 'mtime', 'version', 'overviews', 'tags']
+)
+
+
+def overview_level(snapshot, sample_rate):
+    """(factor, band) of the coarsest overview whose pixels are no bigger than sample_rate pixels.
+
+    Factor 1 is the full-resolution band.
+    """
+    factor = max((f for f in snapshot.overviews if f <= sample_rate), default=1)
+    return factor, snapshot.overviews.get(factor, snapshot.data)
+
+
+class RasterStore:
+    """Keeps one band of a GeoTIFF resident (or memory-mapped) for fast window reads.
+
+    The band is decoded once and shared read-only between request threads.
+    When the file's mtime changes the band is reloaded on the next access.
+    """
+
+    def __init__(self, path, band=1, mmap_dir=None):
+        self.path = path
+        self.band = band
+        # When set, the decoded band is written to a .npy sidecar in this
+        # directory and memory-mapped, so the pages live in the OS cache.
+        self.mmap_dir = mmap_dir
+        self._snapshot = None
+        self._mmap_path = None
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def get(self):
+        """Return the current snapshot, reloading the band if the file changed"""
+        mtime = os.stat(self.path).st_mtime_ns
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.mtime == mtime:
+            return snapshot
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.mtime != mtime:
+                snapshot = self._load()
+                self._snapshot = snapshot
+            return snapshot
+
+    def window(self, row_min, row_max, col_min, col_max, snapshot=None):
+        """Return a zero-copy, read-only view of rows [row_min, row_max) and cols [col_min, col_max)"""
+        if snapshot is None:
+            snapshot = self.get()
+        return snapshot.data[row_min:row_max, col_min:col_max]
+
+    def memory_info(self):
+        """Describe how much memory the resident band is using"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"loaded": False, "mode": self._mode()}
+        return {
+            "loaded": True,
+            "mode": self._mode(),
+            "nbytes": int(snapshot.data.nbytes),
+            "shape": list(snapshot.data.shape),
+            "dtype": str(snapshot.data.dtype),
+            "mmap_path": self._mmap_path,
+            "version": snapshot.version,
+            "overview_factors": sorted(snapshot.overviews),
+            "overview_nbytes": int(sum(level.nbytes for level in snapshot.overviews.values())),
+            "reloads": self.reloads
+        }
+
+    def _mode(self):
+        return "mmap" if self.mmap_dir else "memory"
+
+    def _load(self):
+        stat = os.stat(self.path)
+        with rasterio.open(self.path) as src:
+            data = src.read(self.band)
+            # Overviews are small next to the band, so they're always held in memory
+            overviews = {
+                factor: src.read(self.band, out_shape=(math.ceil(src.height / factor), math.ceil(src.width / factor)))
+                for factor in src.overviews(self.band)
+            }
+            transform = src.transform
+            bounds = src.bounds
+            crs = src.crs
+            nodata = src.nodata
+            tags = src.tags()
+
+        # Identifies the raster contents, so caches keyed on it survive
+        # restarts and copies of the same file to other hosts
+        digest = hashlib.sha1(np.ascontiguousarray(data).view(np.uint8))
+        digest.update(repr(tuple(transform)).encode())
+        version = digest.hexdigest()[:16]
+
+        if self.mmap_dir:
+            data = self._memory_map(data, stat.st_mtime_ns)
+        else:
+            data.setflags(write=False)
+        for level in overviews.values():
+            level.setflags(write=False)
+
+        if self._snapshot is not None:
+            self.reloads += 1
+        logger.info("Raster store loaded %s (%s, %.1f MB, overviews %s)",
+                    self.path, self._mode(), data.nbytes / 1e6, sorted(overviews) or 'none')
+
+        return RasterSnapshot(
+            data=data,
+            transform=transform,
+            inverse_transform=~transform,
+            bounds=bounds,
+            crs=crs,
+            nodata=nodata,
+            mtime=stat.st_mtime_ns,
+            version=version,
+            overviews=overviews,
+            tags=tags
+        )
+
+    def _memory_map(self, data, mtime):
+        os.makedirs(self.mmap_dir, exist_ok=True)
+        base = os.path.splitext(os.path.basename(self.path))[0]
+        mmap_path = os.path.join(self.mmap_dir, f"{base}.b{self.band}.{mtime:x}.npy")
+
+        if not os.path.exists(mmap_path):
+            tmp_path = f"{mmap_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, data)
+            os.replace(tmp_path, mmap_path)
+
+        # Drop sidecars left behind by older versions of the raster. Live
+        # mappings of them stay valid until the last snapshot is released.
+        prefix = f"{base}.b{self.band}."
+        for name in os.listdir(self.mmap_dir):
+            path = os.path.join(self.mmap_dir, name)
+            if name.startswith(prefix) and name.endswith('.npy') and path != mmap_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        self._mmap_path = mmap_path
+        return np.load(mmap_path, mmap_mode='r')
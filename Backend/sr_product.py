@@ -0,0 +1,185 @@
+"""Super-resolve a whole NO2 GeoTIFF offline into an upscaled GeoTIFF.
+
+Run from the Backend directory:
+
+    python sr_product.py data/Delhi_NO2_Jan2023.tif --scale 2
+
+This writes data/Delhi_NO2_Jan2023.sr2x.tif with scale times the pixels of
+the source and the same footprint. The band is bicubic-upsampled and then
+refined by SRCNN, which is what the model is trained to do (see
+model/dataset.py). The server's per-request fallback does the same with
+these functions, so both give the same pixels. The file is tagged with the source raster version and the
+weights hash, and the server reads high-zoom windows from it while both still
+match, instead of running SRCNN per request.
+"""
+import argparse
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.windows import Window
+
+from raster_store import RasterStore
+from srcnn import (INFERENCE_BACKENDS, SRCNN_RECEPTIVE_RADIUS, build_srcnn_model, make_predict_fn,
+                   predict_tiled, weights_hash)
+
+BLOCK_SIZE = 256
+_PRODUCT_PATTERN = re.compile(r'\.sr\d+x\.tiff?$', re.IGNORECASE)
+
+
+def product_path(path, scale=2):
+    """Where the super-resolved product of a GeoTIFF (or of its COG) lives"""
+    base = re.sub(r'(\.cog)?\.tiff?$', '', path, flags=re.IGNORECASE)
+    return f"{base}.sr{scale}x.tif"
+
+
+def is_product(path):
+    """Whether path names a super-resolved product rather than a source raster"""
+    return bool(_PRODUCT_PATTERN.search(path))
+
+
+def read_tags(path):
+    """A product's metadata tags, without reading its pixels"""
+    with rasterio.open(path) as src:
+        return src.tags()
+
+
+def is_fresh(tags, source, model_hash):
+    """Whether a product with these tags was built from this source snapshot and these weights"""
+    return tags.get('SR_SOURCE_VERSION') == source.version and tags.get('SR_WEIGHTS_HASH') == model_hash
+
+
+def upsample_bicubic(data, scale):
+    """Bicubic upsampling of a 2-D array by an integer factor, as float32"""
+    import tensorflow as tf
+
+    height, width = data.shape
+    image = tf.convert_to_tensor(data[np.newaxis, :, :, np.newaxis], dtype=tf.float32)
+    return tf.image.resize(image, (height * scale, width * scale), method='bicubic').numpy()[0, :, :, 0]
+
+
+def context_pixels(scale):
+    """Source pixels around a window that affect its super-resolved pixels"""
+    # Bicubic reaches 2 source pixels, SRCNN its receptive radius in output pixels
+    return 2 + math.ceil(SRCNN_RECEPTIVE_RADIUS / scale)
+
+
+def valid_mask(data, nodata):
+    """Pixels of a band that hold data"""
+    valid = np.isfinite(data)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= data != nodata
+    return valid
+
+
+def band_range(data, nodata):
+    """(min, span) of a band's valid values, which normalize it for SRCNN"""
+    valid = valid_mask(data, nodata)
+    data_min = float(data[valid].min()) if valid.any() else 0.0
+    data_max = float(data[valid].max()) if valid.any() else 0.0
+    return data_min, (data_max - data_min) or 1.0
+
+
+def super_resolve_block(predict_fn, data, nodata, data_min, span, scale, tile_size, halo, max_batch):
+    """Super-resolve a block of a band normalized by band_range, at scale times the pixels.
+
+    Pixels without data stay NaN. The outer context_pixels(scale) source
+    pixels of the block are only there as context and aren't exact.
+    """
+    valid = valid_mask(data, nodata)
+    norm = np.where(valid, (data - data_min) / span, 0).astype(np.float32)
+    predicted = predict_tiled(predict_fn, upsample_bicubic(norm, scale),
+                              tile_size=tile_size, halo=halo, max_batch=max_batch)
+    mask = np.repeat(np.repeat(valid, scale, axis=0), scale, axis=1)
+    return np.where(mask, predicted * span + data_min, np.nan).astype(np.float32)
+
+
+def super_resolve_strip(predict_fn, source, data_range, row_start, row_stop, scale, tile_size, halo, max_batch):
+    """Super-resolved rows [row_start, row_stop) of a snapshot's band, at scale times the pixels.
+
+    Enough rows around the strip are upsampled and predicted that the result
+    matches processing the whole band at once.
+    """
+    pad = context_pixels(scale)
+    read_start = max(0, row_start - pad)
+    read_stop = min(source.data.shape[0], row_stop + pad)
+    predicted = super_resolve_block(predict_fn, source.data[read_start:read_stop], source.nodata, *data_range,
+                                    scale, tile_size, halo, max_batch)
+    offset = (row_start - read_start) * scale
+    return predicted[offset:offset + (row_stop - row_start) * scale]
+
+
+def build(src_path, dst_path, model_path, scale=2, backend='keras', threads=None,
+          strip_rows=256, tile_size=128, halo=8, max_batch=16):
+    """Write the super-resolved product of src_path to dst_path"""
+    source = RasterStore(src_path).get()
+    height, width = source.data.shape
+    # One normalization for the whole band, so strips don't show seams
+    data_range = band_range(source.data, source.nodata)
+
+    model = build_srcnn_model()
+    model.load_weights(model_path)
+    predict_fn = make_predict_fn(model, backend)
+
+    profile = dict(
+        driver='GTiff', dtype='float32', count=1, nodata=np.nan,
+        width=width * scale, height=height * scale, crs=source.crs,
+        transform=source.transform * Affine.scale(1 / scale),
+        tiled=True, blockxsize=BLOCK_SIZE, blockysize=BLOCK_SIZE, compress='deflate', predictor=3
+    )
+    strips = [(start, min(start + strip_rows, height)) for start in range(0, height, strip_rows)]
+
+    def run(strip):
+        row_start, row_stop = strip
+        return super_resolve_strip(predict_fn, source, data_range, row_start, row_stop, scale,
+                                   tile_size, halo, max_batch)
+
+    tmp_path = f"{dst_path}.{os.getpid()}.tmp"
+    try:
+        # Strips are predicted in parallel and written in order from this thread;
+        # a rasterio dataset must only be used from the thread that opened it
+        with rasterio.open(tmp_path, 'w', **profile) as dst, ThreadPoolExecutor(threads) as pool:
+            for (row_start, row_stop), result in zip(strips, pool.map(run, strips)):
+                dst.write(result, 1, window=Window(0, row_start * scale, width * scale, result.shape[0]))
+            dst.update_tags(
+                SR_SCALE=scale,
+                SR_SOURCE=os.path.basename(src_path),
+                SR_SOURCE_VERSION=source.version,
+                SR_WEIGHTS_HASH=weights_hash(model_path)
+            )
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('src', help='GeoTIFF to super-resolve')
+    parser.add_argument('dst', nargs='?', help='Output path (default: <src>.sr<scale>x.tif)')
+    parser.add_argument('--scale', type=int, default=2)
+    parser.add_argument('--weights', default=os.path.join(os.path.dirname(__file__), 'model', 'srcnn_model.h5'))
+    parser.add_argument('--backend', default='keras', choices=INFERENCE_BACKENDS)
+    parser.add_argument('--threads', type=int, default=os.cpu_count(), help='Strips predicted at once')
+    parser.add_argument('--strip-rows', type=int, default=256, help='Source rows per strip')
+    parser.add_argument('--tile-size', type=int, default=128)
+    parser.add_argument('--halo', type=int, default=8)
+    parser.add_argument('--max-batch', type=int, default=16)
+    args = parser.parse_args()
+
+    dst = args.dst or product_path(args.src, args.scale)
+    started = time.time()
+    build(args.src, dst, args.weights, args.scale, args.backend, args.threads,
+          args.strip_rows, args.tile_size, args.halo, args.max_batch)
+    with rasterio.open(dst) as product:
+        print(f"Wrote {dst}: {product.height}x{product.width}, {product.res[0]:.1f} m pixels, "
+              f"in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
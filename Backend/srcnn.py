@@ -0,0 +1,292 @@
+import hashlib
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import Future
+
+import numpy as np
+
+# How far (in pixels) each SRCNN output reaches into its input on every side:
+# 4 for the 9x9 layer, 0 for the 1x1 layer and 2 for the 5x5 layer
+SRCNN_RECEPTIVE_RADIUS = 6
+# Outputs this close to a zero-padded tile edge differ from unpadded inference:
+# the 5x5 layer reads activations of the padding there instead of its own zeros
+PAD_EDGE_PIXELS = 2
+
+
+def build_srcnn_model():
+    """The SRCNN architecture the weights in model/srcnn_model.h5 were trained for"""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import InputLayer, Conv2D
+
+    model = Sequential([
+        InputLayer(input_shape=(None, None, 1)),
+        Conv2D(64, (9, 9), activation='relu', padding='same'),
+        Conv2D(32, (1, 1), activation='relu', padding='same'),
+        Conv2D(1, (5, 5), activation='linear', padding='same')
+    ])
+    model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+    return model
+
+
+# Ways of running the loaded model. All take and return (n, h, w, 1) float32.
+#   keras        model.predict, the reference implementation
+#   tf_function  one traced concrete function with dynamic batch and spatial dims
+#   tflite       the model converted to a TFLite flatbuffer, one interpreter per input shape
+INFERENCE_BACKENDS = ('keras', 'tf_function', 'tflite')
+
+
+def make_predict_fn(model, backend='keras'):
+    """Return a predict function for model using the given inference backend"""
+    if backend == 'keras':
+        return lambda batch: model.predict(batch, batch_size=len(batch), verbose=0)
+    if backend == 'tf_function':
+        import tensorflow as tf
+
+        concrete = _serving_function(model)
+        return lambda batch: concrete(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+    if backend == 'tflite':
+        return TFLitePredictor(model)
+    raise ValueError(f"Unknown inference backend {backend!r}, expected one of {INFERENCE_BACKENDS}")
+
+
+def _serving_function(model):
+    """Trace the model once for any batch size and tile shape"""
+    import tensorflow as tf
+
+    @tf.function(input_signature=[tf.TensorSpec([None, None, None, 1], tf.float32)])
+    def serve(batch):
+        return model(batch, training=False)
+
+    return serve.get_concrete_function()
+
+
+class TFLitePredictor:
+    """Runs the model through the TFLite interpreter.
+
+    Interpreters are not thread-safe and resizing inputs is costly, so one
+    interpreter is kept per input shape and calls are serialized.
+    """
+
+    def __init__(self, model):
+        import tensorflow as tf
+        from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            Interpreter = tf.lite.Interpreter
+
+        self._interpreter_cls = Interpreter
+        # Weights must be folded into constants, TFLite can't read Keras variables
+        frozen = convert_variables_to_constants_v2(_serving_function(model))
+        self.flatbuffer = tf.lite.TFLiteConverter.from_concrete_functions([frozen]).convert()
+        self._interpreters = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            interpreter = self._interpreters.get(batch.shape)
+            if interpreter is None:
+                interpreter = self._interpreter_cls(model_content=self.flatbuffer)
+                input_index = interpreter.get_input_details()[0]['index']
+                interpreter.resize_tensor_input(input_index, batch.shape, strict=False)
+                interpreter.allocate_tensors()
+                self._interpreters[batch.shape] = interpreter
+            interpreter.set_tensor(interpreter.get_input_details()[0]['index'], batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(interpreter.get_output_details()[0]['index']).copy()
+
+
+def max_abs_difference(predict_fn, reference_fn, shape=(2, 48, 40, 1), seed=0):
+    """Largest absolute difference between two predict functions on a random batch"""
+    batch = np.random.default_rng(seed).random(shape).astype(np.float32)
+    return float(np.max(np.abs(np.asarray(predict_fn(batch)) - np.asarray(reference_fn(batch)))))
+
+
+def _tile_spans(length, tile_size, halo):
+    """Split one image axis into (core_start, core_end, crop_start) spans sharing one crop size.
+
+    Crops are clamped inside the image rather than padded, so every crop edge
+    is either a real image edge or at least `halo` pixels from its core.
+    """
+    crop = tile_size + 2 * halo
+    if length <= crop:
+        return length, [(0, length, 0)]
+
+    spans = []
+    for start in range(0, length, tile_size):
+        end = min(start + tile_size, length)
+        crop_start = min(max(start - halo, 0), length - crop)
+        spans.append((start, end, crop_start))
+    return crop, spans
+
+
+def predict_tiled(predict_fn, image, tile_size=128, halo=8, max_batch=16):
+    """Run a fully-convolutional model over a 2-D image in overlapping tiles.
+
+    predict_fn takes a (n, h, w, 1) float32 batch and returns the same shape.
+    Tiles are predicted max_batch at a time, which bounds peak memory
+    regardless of the image size. With halo >= SRCNN_RECEPTIVE_RADIUS the
+    stitched result matches whole-image inference.
+    """
+    if halo < SRCNN_RECEPTIVE_RADIUS:
+        raise ValueError(f"halo must be at least {SRCNN_RECEPTIVE_RADIUS} pixels, got {halo}")
+
+    image = np.asarray(image, dtype=np.float32)
+    height, width = image.shape
+    crop_h, row_spans = _tile_spans(height, tile_size, halo)
+    crop_w, col_spans = _tile_spans(width, tile_size, halo)
+    tiles = [(r, c) for r in row_spans for c in col_spans]
+
+    output = np.empty((height, width), dtype=np.float32)
+    for i in range(0, len(tiles), max_batch):
+        chunk = tiles[i:i + max_batch]
+        batch = np.stack([
+            image[r[2]:r[2] + crop_h, c[2]:c[2] + crop_w] for r, c in chunk
+        ])[..., np.newaxis]
+        predicted = np.asarray(predict_fn(batch))[..., 0]
+
+        for ((row_start, row_end, crop_row), (col_start, col_end, crop_col)), tile in zip(chunk, predicted):
+            output[row_start:row_end, col_start:col_end] = tile[
+                row_start - crop_row:row_end - crop_row,
+                col_start - crop_col:col_end - crop_col
+            ]
+    return output
+
+
+def weights_hash(path):
+    """Short content hash of a weights file"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class InferenceScheduler:
+    """Micro-batches predict calls from concurrent requests onto one worker thread.
+
+    Callers block in predict() while the worker collects queued batches for up
+    to max_wait_ms (or until max_batch tiles are waiting), runs predict_fn once
+    per max_batch tiles and hands each caller back its slice. Windows of
+    different bboxes rarely have the same shape, so smaller tiles are
+    zero-padded at the bottom and right to the shape of a larger one and the
+    outputs cropped back, as long as that at most multiplies their pixels by
+    max_pad_ratio (1 only stacks tiles of the same shape). Padding changes
+    the outputs within PAD_EDGE_PIXELS of the padded edges slightly, since the
+    last layer sees activations there instead of zero padding.
+    """
+
+    def __init__(self, predict_fn, max_batch=16, max_wait_ms=5.0, max_pad_ratio=4.0):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_pad_ratio = max_pad_ratio
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.tiles = 0
+        self.batches = 0
+        self.padded_tiles = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = Counter()
+
+    def predict(self, batch):
+        """Predict a (n, h, w, 1) batch, sharing the model call with other waiting requests"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((np.asarray(batch, dtype=np.float32), future))
+        with self._stats_lock:
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future.result()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "requests": self.requests,
+                "tiles": self.tiles,
+                "batches": self.batches,
+                "mean_batch_size": self.tiles / self.batches if self.batches else 0.0,
+                "padded_tiles": self.padded_tiles,
+                "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "max_pad_ratio": self.max_pad_ratio
+            }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='srcnn-scheduler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            waiting_tiles = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while waiting_tiles < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                waiting_tiles += len(item[0])
+
+            for shape, items in self._group(pending).items():
+                self._execute(shape, items)
+
+    def _group(self, pending):
+        """Map each batch shape to the requests padded to it, largest tiles first"""
+        groups = defaultdict(list)
+        for item in sorted(pending, key=lambda item: item[0].shape[1] * item[0].shape[2], reverse=True):
+            height, width = item[0].shape[1:3]
+            for group_height, group_width, channels in groups:
+                if (height <= group_height and width <= group_width and
+                        height * width * self.max_pad_ratio >= group_height * group_width):
+                    groups[group_height, group_width, channels].append(item)
+                    break
+            else:
+                groups[item[0].shape[1:]].append(item)
+        return groups
+
+    def _execute(self, shape, items):
+        height, width = shape[:2]
+        padded = [np.pad(tiles, ((0, 0), (0, height - tiles.shape[1]), (0, width - tiles.shape[2]), (0, 0)))
+                  if tiles.shape[1:] != shape else tiles
+                  for tiles, _ in items]
+        batch = np.concatenate(padded)
+        try:
+            outputs = []
+            for start in range(0, len(batch), self.max_batch):
+                chunk = batch[start:start + self.max_batch]
+                outputs.append(np.asarray(self.predict_fn(chunk)))
+                with self._stats_lock:
+                    self.batches += 1
+                    self.batch_sizes[len(chunk)] += 1
+            output = np.concatenate(outputs)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        with self._stats_lock:
+            self.requests += len(items)
+            self.tiles += len(batch)
+            self.padded_tiles += sum(len(tiles) for tiles, _ in items if tiles.shape[1:] != shape)
+        offset = 0
+        for tiles, future in items:
+            future.set_result(output[offset:offset + len(tiles), :tiles.shape[1], :tiles.shape[2]])
+            offset += len(tiles)
@@ -0,0 +1,263 @@
+"""XYZ (slippy map) AQI tiles rendered from the NO2 GeoTIFF, with an on-disk tile cache.
+
+Pre-seed the cache for Delhi from the Backend directory with:
+
+    python tiles.py seed --min-zoom 8 --max-zoom 14
+"""
+import argparse
+import hashlib
+import io
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import geo
+from features import AQI_COLORS, aqi_category, values_to_aqi
+
+TILE_SIZE = 256
+MAX_ZOOM = 22
+
+# AQI value marking tile pixels outside the raster or without data
+GRID_NODATA = 65535
+
+TILE_FORMATS = {
+    'png': 'image/png',
+    # Raw little-endian uint16 AQI, TILE_SIZE x TILE_SIZE, row-major, GRID_NODATA for no data
+    'bin': 'application/octet-stream'
+}
+
+DEFAULT_GEOTIFF_PATH = os.path.join(os.path.dirname(__file__), 'data', 'Delhi_NO2_Jan2023.tif')
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'cache', 'tiles')
+DELHI_BOUNDS = (77.0, 28.4, 77.4, 28.8)  # (west, south, east, north)
+
+# Eviction deletes tiles until the cache is this fraction of its budget, so
+# the cache directory isn't walked again on every following put
+EVICT_TO = 0.9
+
+logger = logging.getLogger(__name__)
+
+# RGBA lookup table indexed by AQI category, with a transparent slot for no data
+_PALETTE = np.array(
+    [[int(c[1:3], 16), int(c[3:5], 16), int(c[5:7], 16), 255] for c in AQI_COLORS] + [[0, 0, 0, 0]],
+    dtype=np.uint8
+)
+
+
+def tile_exists(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def lonlat_to_tile(lon, lat, z):
+    """Tile (x, y) containing a WGS 84 point at zoom z"""
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_pixel_lonlat(z, x, y, size=TILE_SIZE):
+    """Lon/lat grids of the centres of a tile's pixels, each of shape (size, size)"""
+    n = 2 ** z
+    offsets = (np.arange(size, dtype=np.float64) + 0.5) / size
+    lons = (x + offsets) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * (y + offsets) / n))))
+    return np.meshgrid(lons, lats)
+
+
+def render_aqi_grid(snapshot, z, x, y, size=TILE_SIZE):
+    """Nearest-neighbour AQI for every tile pixel as uint16, GRID_NODATA where there is no data"""
+    lons, lats = tile_pixel_lonlat(z, x, y, size)
+    rows, cols = geo.lonlat_to_pixel(lons.ravel(), lats.ravel(), snapshot.inverse_transform)
+
+    height, width = snapshot.data.shape
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+
+    grid = np.full(size * size, GRID_NODATA, dtype=np.uint16)
+    values = snapshot.data[rows[inside], cols[inside]]
+    finite = np.isfinite(values)
+    target = np.flatnonzero(inside)[finite]
+    grid[target] = values_to_aqi(values[finite])
+    return grid.reshape(size, size)
+
+
+def encode_png(grid):
+    from PIL import Image
+
+    category = np.where(grid == GRID_NODATA, len(AQI_COLORS), aqi_category(grid))
+    buffer = io.BytesIO()
+    Image.fromarray(_PALETTE[category]).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def encode_bin(grid):
+    return grid.astype('<u2').tobytes()
+
+
+def render_tile(snapshot, z, x, y, fmt='png'):
+    grid = render_aqi_grid(snapshot, z, x, y)
+    return encode_png(grid) if fmt == 'png' else encode_bin(grid)
+
+
+class TileCache:
+    """Content-addressed tile store: one file per (raster version, z, x, y, format).
+
+    Tiles live under a directory per source raster path and, inside it, one
+    per version, named so that later versions sort last. The first tile of a
+    new version removes the earlier versions of the same source, and once it
+    holds more than max_bytes its oldest tiles are deleted. Other sources
+    sharing the root are never touched.
+    """
+
+    def __init__(self, root, max_bytes=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        # Current version directory and bytes cached in it, per source directory
+        self._versions = {}
+        self._bytes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def version(source, snapshot):
+        """Directory of a snapshot's tiles: its source path's digest, then its mtime and version"""
+        source_digest = hashlib.sha1(os.path.abspath(source).encode()).hexdigest()[:16]
+        # Zero-padded so later rasters sort after earlier ones
+        return f"{source_digest}/{snapshot.mtime:016x}-{snapshot.version}"
+
+    @staticmethod
+    def key(raster_version, z, x, y, fmt):
+        digest = hashlib.sha1(f"{raster_version}/{z}/{x}/{y}.{fmt}".encode()).hexdigest()
+        return f"{raster_version}/{digest}"
+
+    def path(self, key, fmt):
+        source, version, digest = key.split('/')
+        return os.path.join(self.root, source, version, digest[:2], f"{digest[2:]}.{fmt}")
+
+    def get(self, key, fmt):
+        try:
+            with open(self.path(key, fmt), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, fmt, data):
+        source, version, _ = key.split('/')
+        if not self._use_version(source, version):
+            # A worker thread still on an older raster
+            return
+        path = self.path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial tile
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._bytes[source] += len(data)
+            over_budget = self.max_bytes is not None and self._bytes[source] > self.max_bytes
+        if over_budget:
+            self._evict(source)
+
+    def _use_version(self, source, version):
+        """Make version current for source, pruning earlier ones. False if a later version is current."""
+        with self._lock:
+            current = self._versions.get(source)
+            if current is not None and current >= version:
+                return current == version
+            self._versions[source] = version
+            source_dir = os.path.join(self.root, source)
+            for name in os.listdir(source_dir) if os.path.isdir(source_dir) else []:
+                if name < version:
+                    shutil.rmtree(os.path.join(source_dir, name), ignore_errors=True)
+            self._bytes[source] = sum(size for _, _, size in self._files(source))
+            logger.info("Tile cache for %s switched to %s (%d bytes cached)", source, version, self._bytes[source])
+        return True
+
+    def _files(self, source):
+        """(mtime, path, size) of every tile of a source's current version"""
+        files = []
+        for directory, _, names in os.walk(os.path.join(self.root, source, self._versions[source])):
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, os.path.join(directory, name), stat.st_size))
+        return files
+
+    def _evict(self, source):
+        """Delete a source's oldest tiles until it is at EVICT_TO of max_bytes"""
+        with self._lock:
+            # Other workers write here too, so count what's actually on disk
+            files = sorted(self._files(source))
+            total = sum(size for _, _, size in files)
+            target = self.max_bytes * EVICT_TO
+            for _, path, size in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self._bytes[source] = total
+
+
+def get_or_render_tile(cache, source, snapshot, z, x, y, fmt='png'):
+    """Return (tile bytes, True if it came from the cache) for a snapshot of the raster at source"""
+    key = cache.key(cache.version(source, snapshot), z, x, y, fmt)
+    data = cache.get(key, fmt)
+    if data is not None:
+        return data, True
+    data = render_tile(snapshot, z, x, y, fmt)
+    cache.put(key, fmt, data)
+    return data, False
+
+
+def seed(store, cache, min_zoom, max_zoom, bounds=DELHI_BOUNDS, formats=('png',)):
+    """Render every tile covering bounds for zoom levels min_zoom..max_zoom into the cache"""
+    snapshot = store.get()
+    west, south, east, north = bounds
+    total = rendered = 0
+    start = time.perf_counter()
+    for z in range(min_zoom, max_zoom + 1):
+        x_min, y_min = lonlat_to_tile(west, north, z)
+        x_max, y_max = lonlat_to_tile(east, south, z)
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                for fmt in formats:
+                    _, cached = get_or_render_tile(cache, store.path, snapshot, z, x, y, fmt)
+                    total += 1
+                    rendered += not cached
+        print(f"Zoom {z}: {(x_max - x_min + 1) * (y_max - y_min + 1)} tiles")
+    print(f"Seeded {total} tiles ({rendered} rendered, {total - rendered} already cached) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    from raster_store import RasterStore
+
+    parser = argparse.ArgumentParser(description="AQI tile cache tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    seed_parser = subparsers.add_parser('seed', help="Pre-render tiles into the cache")
+    seed_parser.add_argument('--geotiff', default=DEFAULT_GEOTIFF_PATH)
+    seed_parser.add_argument('--cache-dir', default=os.environ.get('AQI_TILE_CACHE_DIR', DEFAULT_CACHE_DIR))
+    seed_parser.add_argument('--cache-mb', type=float, default=float(os.environ.get('AQI_TILE_CACHE_MB', 1024)))
+    seed_parser.add_argument('--min-zoom', type=int, default=8)
+    seed_parser.add_argument('--max-zoom', type=int, default=14)
+    seed_parser.add_argument('--bounds', type=float, nargs=4, default=DELHI_BOUNDS,
+                             metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'))
+    seed_parser.add_argument('--formats', nargs='+', default=['png'], choices=sorted(TILE_FORMATS))
+    args = parser.parse_args()
+
+    seed(RasterStore(args.geotiff), TileCache(args.cache_dir, int(args.cache_mb * 1024 * 1024)), args.min_zoom, args.max_zoom,
+         tuple(args.bounds), tuple(args.formats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""AQI statistics over bounding boxes and polygons.
+
+Bounding boxes are answered from summed-area tables of the AQI sum and of
+each category's pixel count. They are built once per raster, so count, mean
+and the category histogram take four lookups per table at any box size.
+Min and max come from sparse tables of per-block extremes: the whole blocks
+inside a box take four lookups, and only the partial blocks along its edges
+are reduced, so the cost grows with the box's perimeter rather than its
+area. Polygons are rasterized to a mask over their bounding window.
+"""
+import numpy as np
+from affine import Affine
+from rasterio import features as rio_features
+from rasterio.warp import transform_geom
+
+import geo
+from features import AQI_CATEGORY_NAMES, AQI_COLORS, aqi_category, values_to_aqi
+
+
+# Extremes are kept per block of at least EXTREMA_BLOCK pixels square, with
+# blocks made bigger for large rasters so there are at most EXTREMA_MAX_BLOCKS
+# along either side
+EXTREMA_BLOCK = 64
+EXTREMA_MAX_BLOCKS = 256
+
+
+def table_bytes(shape):
+    """Memory used by region_tables for a band of this shape"""
+    height, width = shape
+    block = extrema_block(shape)
+    block_rows, block_cols = -(-height // block), -(-width // block)
+    extrema = 2 * block_rows.bit_length() * block_cols.bit_length() * block_rows * block_cols * 4
+    return (height + 1) * (width + 1) * (8 + 4 * len(AQI_COLORS)) + extrema
+
+
+def region_tables(data):
+    """(AQI sums, category counts, block minima, block maxima) tables for box_stats"""
+    return summed_area_tables(data) + extrema_tables(data)
+
+
+def summed_area_tables(data):
+    """(AQI sum table, per-category pixel count tables) of a band.
+
+    Entry [r, c] covers rows [0, r) and cols [0, c), so tables have one more
+    row and column than the band.
+    """
+    valid = np.isfinite(data)
+    aqi = np.zeros(data.shape, dtype=np.int64)
+    aqi[valid] = values_to_aqi(data[valid])
+    category = np.where(valid, aqi_category(aqi), -1)
+
+    sums = _integral(aqi, np.int64)
+    counts = np.stack([_integral(category == k, np.int32) for k in range(len(AQI_COLORS))])
+    return sums, counts
+
+
+def _integral(values, dtype):
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=dtype)
+    np.cumsum(values, axis=0, dtype=dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
+def extrema_block(shape):
+    """Edge length in pixels of the blocks extrema_tables summarizes"""
+    return max(EXTREMA_BLOCK, -(-max(shape) // EXTREMA_MAX_BLOCKS))
+
+
+def extrema_tables(data):
+    """(minima, maxima) sparse tables of a band's valid values per block.
+
+    Entry [k, l, i, j] covers blocks [i, i + 2**k) x [j, j + 2**l); blocks
+    without valid values hold +inf in minima and -inf in maxima.
+    """
+    block = extrema_block(data.shape)
+    height, width = data.shape
+    block_rows, block_cols = -(-height // block), -(-width // block)
+    padded = np.full((block_rows * block, block_cols * block), np.nan, dtype=np.float32)
+    padded[:height, :width] = data
+    blocks = padded.reshape(block_rows, block, block_cols, block)
+    finite = np.isfinite(blocks)
+    low = np.min(blocks, axis=(1, 3), where=finite, initial=np.inf)
+    high = np.max(blocks, axis=(1, 3), where=finite, initial=-np.inf)
+    return _sparse_table(low, np.minimum, np.inf), _sparse_table(high, np.maximum, -np.inf)
+
+
+def _sparse_table(blocks, op, fill):
+    rows, cols = blocks.shape
+    table = np.full((rows.bit_length(), cols.bit_length(), rows, cols), fill, dtype=np.float32)
+    table[0, 0] = blocks
+    for k in range(1, rows.bit_length()):
+        n, half = rows - (1 << k) + 1, 1 << (k - 1)
+        op(table[k - 1, 0, :n], table[k - 1, 0, half:half + n], out=table[k, 0, :n])
+    for l in range(1, cols.bit_length()):
+        n, half = cols - (1 << l) + 1, 1 << (l - 1)
+        op(table[:, l - 1, :, :n], table[:, l - 1, :, half:half + n], out=table[:, l, :, :n])
+    return table
+
+
+def _query(table, op, row_min, row_max, col_min, col_max):
+    """Reduction of blocks [row_min, row_max) x [col_min, col_max) from four overlapping table entries"""
+    k, l = (row_max - row_min).bit_length() - 1, (col_max - col_min).bit_length() - 1
+    level = table[k, l]
+    rows, cols = (row_min, row_max - (1 << k)), (col_min, col_max - (1 << l))
+    return op.reduce([level[r, c] for r in rows for c in cols])
+
+
+def box_extrema(mins, maxs, data, row_min, row_max, col_min, col_max):
+    """(min, max) valid value over rows [row_min, row_max) and cols [col_min, col_max) of data.
+
+    (+inf, -inf) when there is none.
+    """
+    row_min, row_max, col_min, col_max = int(row_min), int(row_max), int(col_min), int(col_max)
+    block = extrema_block(data.shape)
+    block_row_min, block_row_max = -(-row_min // block), row_max // block
+    block_col_min, block_col_max = -(-col_min // block), col_max // block
+    if block_row_min >= block_row_max or block_col_min >= block_col_max:
+        # Too small to contain a whole block
+        return _extrema(data[row_min:row_max, col_min:col_max])
+
+    low = _query(mins, np.minimum, block_row_min, block_row_max, block_col_min, block_col_max)
+    high = _query(maxs, np.maximum, block_row_min, block_row_max, block_col_min, block_col_max)
+    inner_top, inner_bottom = block_row_min * block, block_row_max * block
+    inner_left, inner_right = block_col_min * block, block_col_max * block
+    for strip in (data[row_min:inner_top, col_min:col_max], data[inner_bottom:row_max, col_min:col_max],
+                  data[inner_top:inner_bottom, col_min:inner_left],
+                  data[inner_top:inner_bottom, inner_right:col_max]):
+        strip_low, strip_high = _extrema(strip)
+        low, high = min(low, strip_low), max(high, strip_high)
+    return float(low), float(high)
+
+
+def _extrema(window):
+    finite = np.isfinite(window)
+    return (float(np.min(window, where=finite, initial=np.inf)),
+            float(np.max(window, where=finite, initial=-np.inf)))
+
+
+def box_stats(sums, counts, mins, maxs, data, row_min, row_max, col_min, col_max):
+    """Statistics over rows [row_min, row_max) and cols [col_min, col_max) of data"""
+    def box(table):
+        return (table[..., row_max, col_max] - table[..., row_min, col_max]
+                - table[..., row_max, col_min] + table[..., row_min, col_min])
+
+    histogram = box(counts).astype(np.int64)
+    count = int(histogram.sum())
+    minimum = maximum = None
+    if count:
+        # values_to_aqi never decreases, so the extremes convert directly
+        extremes = box_extrema(mins, maxs, data, row_min, row_max, col_min, col_max)
+        minimum, maximum = (int(v) for v in values_to_aqi(extremes))
+    return summarize(count, int(box(sums)), histogram, minimum, maximum)
+
+
+def masked_stats(data, mask):
+    """Statistics over the pixels of data where mask is True"""
+    values = data[mask]
+    aqi = values_to_aqi(values[np.isfinite(values)])
+    histogram = np.bincount(aqi_category(aqi), minlength=len(AQI_COLORS))
+    if not aqi.size:
+        return summarize(0, 0, histogram, None, None)
+    return summarize(int(aqi.size), int(aqi.sum()), histogram, int(aqi.min()), int(aqi.max()))
+
+
+def summarize(count, total, histogram, minimum, maximum):
+    return {
+        "count": count,
+        "mean": total / count if count else None,
+        "min": minimum,
+        "max": maximum,
+        "histogram": [
+            {"category": name, "color": color, "count": int(n)}
+            for name, color, n in zip(AQI_CATEGORY_NAMES, AQI_COLORS, histogram)
+        ]
+    }
+
+
+def percentiles(data, mask, qs):
+    """AQI percentiles of the pixels with data where mask is True (mask None = all of data)"""
+    values = data if mask is None else data[mask]
+    aqi = values_to_aqi(values[np.isfinite(values)])
+    if not aqi.size:
+        return {str(q): None for q in qs}
+    return {str(q): float(v) for q, v in zip(qs, np.percentile(aqi, qs))}
+
+
+def bbox_window(lonlat_bounds, snapshot):
+    """Pixel window (row_min, row_max, col_min, col_max) of the pixels a WGS 84 bbox touches, clipped to the raster"""
+    west, south, east, north = lonlat_bounds
+    rows, cols = geo.lonlat_to_pixel([west, east, west, east], [north, north, south, south], snapshot.inverse_transform)
+    return _clip_window(rows, cols, snapshot.data.shape)
+
+
+def polygon_mask(geometry, snapshot):
+    """(window, mask) for a GeoJSON geometry in WGS 84.
+
+    mask marks the pixels of window whose centres fall inside the geometry;
+    window is None when the geometry misses the raster.
+    """
+    projected = transform_geom('EPSG:4326', geo.RASTER_CRS, geometry)
+    min_x, min_y, max_x, max_y = rio_features.bounds(projected)
+    rows, cols = geo.xy_to_pixel([min_x, max_x, min_x, max_x], [max_y, max_y, min_y, min_y],
+                                 snapshot.inverse_transform)
+    window = _clip_window(rows, cols, snapshot.data.shape)
+    if window is None:
+        return None, None
+    row_min, row_max, col_min, col_max = window
+    mask = rio_features.geometry_mask(
+        [projected], out_shape=(row_max - row_min, col_max - col_min),
+        transform=snapshot.transform * Affine.translation(col_min, row_min), invert=True
+    )
+    return window, mask
+
+
+def _clip_window(rows, cols, shape):
+    height, width = shape
+    row_min, row_max = max(int(rows.min()), 0), min(int(rows.max()) + 1, height)
+    col_min, col_max = max(int(cols.min()), 0), min(int(cols.max()) + 1, width)
+    if row_min >= row_max or col_min >= col_max:
+        return None
+    return row_min, row_max, col_min, col_max
@@ -138,7 +138,13 @@ export default function HeatmapLayer({ aqiData, zoom }) {
             
             // Use the appropriate processing method based on zoom level
             let enhancedData;
-            if (zoom < 12) {
+            if (aqiData.metadata?.interpolation) {
+              // Already resampled onto a regular grid by the server
+              enhancedData = {
+                type: 'FeatureCollection',
+                features: processedFeatures
+              };
+            } else if (zoom < 12) {
               // For lower zoom, use a density grid (fewer points, better performance)
               enhancedData = createDensityGrid({
                 type: 'FeatureCollection',
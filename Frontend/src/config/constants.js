@@ -55,4 +55,11 @@ export const AQI_CATEGORIES = {
     label: 'Hazardous',
     desc: 'Health warning of emergency conditions: everyone is more likely to be affected.'
   }
-}; 
\ No newline at end of file
+}; 
+
+// From this zoom level the backend resamples the raster onto a regular grid
+// (bilinear, HEATMAP_GRID_SIZE cells along the longer side), so the heatmap
+// needs no interpolation in the browser
+export const SERVER_INTERPOLATION_MIN_ZOOM = 12;
+export const HEATMAP_INTERPOLATION = 'bilinear';
+export const HEATMAP_GRID_SIZE = 160;
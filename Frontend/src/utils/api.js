@@ -2,15 +2,48 @@
 
 // src/utils/api.js
 import axios from 'axios';
+import { getAqiColor } from './colors';
+import { SERVER_INTERPOLATION_MIN_ZOOM, HEATMAP_INTERPOLATION, HEATMAP_GRID_SIZE } from '../config/constants';
 
 // Base URL for your backend API
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:5000';
 
+// Parsed get_air_quality responses by request body, with their ETags. Browsers
+// don't cache POST responses, so we revalidate them ourselves: an unchanged
+// view gets a 304 with no body and reuses the entry.
+const AIR_QUALITY_CACHE_ENTRIES = 32;
+const airQualityCache = new Map();
+
 export async function fetchAirQualityData(bounds) {
   try {
     console.log(`Sending request to ${API_BASE_URL}/api/get_air_quality with bounds:`, bounds);
     
-    const response = await axios.post(`${API_BASE_URL}/api/get_air_quality`, bounds);
+    // Ask for the compact binary grid; mock data and errors still come back as JSON.
+    // Zoomed in, the server also resamples it so the heatmap needs no client-side interpolation
+    const request = { ...bounds, format: 'grid' };
+    if (bounds.zoom_level >= SERVER_INTERPOLATION_MIN_ZOOM) {
+      request.interpolation = HEATMAP_INTERPOLATION;
+      request.grid_size = HEATMAP_GRID_SIZE;
+    }
+    const cacheKey = JSON.stringify(request);
+    const cached = airQualityCache.get(cacheKey);
+    const response = await axios.post(
+      `${API_BASE_URL}/api/get_air_quality`,
+      request,
+      {
+        responseType: 'arraybuffer',
+        headers: cached ? { 'If-None-Match': cached.etag } : {},
+        validateStatus: (status) => (status >= 200 && status < 300) || status === 304
+      }
+    );
+    if (response.status === 304 && cached) {
+      console.log('Air quality data unchanged, reusing the cached response');
+      // Re-insert so the least recently used entry is evicted first
+      airQualityCache.delete(cacheKey);
+      airQualityCache.set(cacheKey, cached);
+      return cached.data;
+    }
+    response.data = parseAirQualityResponse(response);
     
     // Validate response structure
     if (!response.data || typeof response.data !== 'object') {
@@ -34,6 +67,15 @@ export async function fetchAirQualityData(bounds) {
       console.log('Response metadata:', response.data.metadata);
     }
     
+    const etag = response.headers['etag'];
+    if (etag) {
+      airQualityCache.delete(cacheKey);
+      airQualityCache.set(cacheKey, { etag, data: response.data });
+      if (airQualityCache.size > AIR_QUALITY_CACHE_ENTRIES) {
+        airQualityCache.delete(airQualityCache.keys().next().value);
+      }
+    }
+    
     return response.data;
   } catch (error) {
     console.error('Error fetching air quality data:', error);
@@ -52,6 +94,71 @@ export async function fetchAirQualityData(bounds) {
   }
 }
 
+// Turn a get_air_quality response (binary grid or JSON) into a FeatureCollection
+function parseAirQualityResponse(response) {
+  const contentType = response.headers['content-type'] || '';
+  if (!contentType.startsWith('application/x-aqi-grid')) {
+    return JSON.parse(new TextDecoder().decode(response.data));
+  }
+  const metadataHeader = response.headers['x-aqi-metadata'];
+  return aqiGridToFeatureCollection(decodeAqiGrid(response.data), metadataHeader ? JSON.parse(metadataHeader) : {});
+}
+
+// Decode the grid format from Backend/formats.py: a 48-byte little-endian header
+// (magic "AQIG", version, nodata, width, height, origin x/y, step x/y as float64)
+// followed by width * height uint16 AQI values, row-major
+export function decodeAqiGrid(buffer) {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== 'AQIG') {
+    throw new Error(`Unexpected AQI grid magic ${magic}`);
+  }
+  const width = view.getUint32(8, true);
+  const height = view.getUint32(12, true);
+  const values = new Uint16Array(width * height);
+  for (let i = 0; i < values.length; i++) {
+    values[i] = view.getUint16(48 + i * 2, true);
+  }
+  return {
+    nodata: view.getUint16(6, true),
+    width,
+    height,
+    originX: view.getFloat64(16, true),
+    originY: view.getFloat64(24, true),
+    stepX: view.getFloat64(32, true),
+    stepY: view.getFloat64(40, true),
+    values
+  };
+}
+
+// Expand a decoded grid into point features, colouring them here instead of on the server
+export function aqiGridToFeatureCollection(grid, metadata = {}) {
+  const features = [];
+  for (let row = 0; row < grid.height; row++) {
+    for (let col = 0; col < grid.width; col++) {
+      const aqi = grid.values[row * grid.width + col];
+      if (aqi === grid.nodata) continue;
+      features.push({
+        type: 'Feature',
+        properties: {
+          aqi: aqi,
+          color: getAqiColor(aqi),
+          is_model_data: true
+        },
+        geometry: {
+          type: 'Point',
+          coordinates: [grid.originX + col * grid.stepX, grid.originY + row * grid.stepY]
+        }
+      });
+    }
+  }
+  return {
+    type: 'FeatureCollection',
+    features: features,
+    metadata: metadata
+  };
+}
+
 // Generate mock data for visualization when API fails
 export function generateMockData(bounds) {
   const { lat_min, lat_max, lon_min, lon_max } = bounds;